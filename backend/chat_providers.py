@@ -0,0 +1,158 @@
+"""LLM providers for the studio chatbot.
+
+Providers stream the reply as text chunks. server.py picks one with CHAT_PROVIDER;
+"fake" answers locally so the chat path can be tested and load-tested offline.
+ChatGateway wraps a provider with a concurrency cap, a bounded wait queue and a per-call timeout.
+"""
+import asyncio
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Optional
+
+# OpenAI-compatible proxy that accepts Emergent universal keys
+EMERGENT_API_BASE = "https://integrations.emergentagent.com/llm"
+
+class ChatProvider(ABC):
+    """Interface shared by the chat providers"""
+
+    @abstractmethod
+    def stream(self, system_message: str, session_id: str, message: str) -> AsyncIterator[str]:
+        """Async generator of reply text chunks"""
+
+    async def complete(self, system_message: str, session_id: str, message: str) -> str:
+        return "".join([chunk async for chunk in self.stream(system_message, session_id, message)])
+
+class EmergentProvider(ChatProvider):
+    """Token streaming through litellm with stream=True. Session history is already in the system
+    message, so each call is stateless; Emergent universal keys are routed through their proxy."""
+
+    def __init__(self, api_key: str, provider: str = "openai", model: str = "gpt-5.2", api_base: Optional[str] = None):
+        self.api_key = api_key
+        self.provider = provider
+        self.model = model
+        if api_base is None and (api_key or "").startswith("sk-emergent-"):
+            api_base = EMERGENT_API_BASE
+        self.api_base = api_base
+
+    async def stream(self, system_message: str, session_id: str, message: str) -> AsyncIterator[str]:
+        import litellm
+
+        response = await litellm.acompletion(
+            model=f"{self.provider}/{self.model}",
+            messages=[{"role": "system", "content": system_message}, {"role": "user", "content": message}],
+            api_key=self.api_key,
+            api_base=self.api_base,
+            stream=True
+        )
+        try:
+            async for chunk in response:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    yield delta
+        finally:
+            # Closing the response drops the upstream connection, so an abandoned reply stops generating
+            close = getattr(response, "aclose", None)
+            if close:
+                await close()
+
+class FakeProvider(ChatProvider):
+    """Canned local replies: waits latency seconds before the first token, then token_delay per word"""
+
+    def __init__(self, latency: float = 0.0, token_delay: float = 0.0):
+        self.latency = latency
+        self.token_delay = token_delay
+
+    def reply(self, message: str) -> str:
+        return f"Thanks for asking about \"{message.strip()[:80]}\". Our team at Hogwarts Music Studio can help - you can book a session directly on the website."
+
+    async def stream(self, system_message: str, session_id: str, message: str) -> AsyncIterator[str]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        words = self.reply(message).split(" ")
+        for i, word in enumerate(words):
+            if i and self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            yield word if i == 0 else f" {word}"
+
+def make_provider(name: str, api_key: str = "", latency: float = 0.0, token_delay: float = 0.0,
+                  model: Optional[str] = None, api_base: Optional[str] = None) -> ChatProvider:
+    if name == "fake":
+        return FakeProvider(latency=latency, token_delay=token_delay)
+    if name == "emergent":
+        provider, _, model_name = (model or "openai/gpt-5.2").partition("/")
+        return EmergentProvider(api_key, provider, model_name, api_base=api_base)
+    raise ValueError(f"Unknown CHAT_PROVIDER {name!r}")
+
+class ChatUnavailable(Exception):
+    """The gateway refused or abandoned a call (queue full, waited too long, or timed out)"""
+
+class ChatGateway:
+    def __init__(self, provider: ChatProvider, max_concurrency: int, max_queue: int, queue_timeout: float, call_timeout: float):
+        self.provider = provider
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.call_timeout = call_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.queued = 0
+        self.stats = {"calls": 0, "rejected": 0, "queue_timeouts": 0, "timeouts": 0, "errors": 0}
+
+    async def _acquire(self):
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()  # free slot, returns without suspending
+        elif self.queued >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise ChatUnavailable("Chat queue is full")
+        else:
+            self.queued += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.stats["queue_timeouts"] += 1
+                raise ChatUnavailable(f"No chat slot within {self.queue_timeout}s")
+            finally:
+                self.queued -= 1
+        self.in_flight += 1
+        self.stats["calls"] += 1
+
+    def _release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    async def stream(self, system_message: str, session_id: str, message: str) -> AsyncIterator[str]:
+        """Provider stream; the whole reply must finish within call_timeout"""
+        await self._acquire()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.call_timeout
+        chunks = self.provider.stream(system_message, session_id, message)
+        try:
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), remaining)
+                except StopAsyncIteration:
+                    return
+                yield chunk
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            raise ChatUnavailable(f"Chat provider timed out after {self.call_timeout}s")
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            self._release()
+            await chunks.aclose()
+
+    async def complete(self, system_message: str, session_id: str, message: str) -> str:
+        return "".join([chunk async for chunk in self.stream(system_message, session_id, message)])
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue
+        }
@@ -0,0 +1,72 @@
+"""Pillow helpers for uploaded images.
+
+Everything here is plain functions on file paths with no app or database state,
+so they can be submitted to a process pool from server.py.
+"""
+import base64
+import io
+import os
+from typing import List
+
+from PIL import Image, ImageOps, features
+
+# format extension -> Pillow encoder name and save options
+VARIANT_FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "avif": ("AVIF", {"quality": 60}),
+}
+
+def avif_supported() -> bool:
+    return features.check("avif") is True
+
+def _prepare(img: Image.Image) -> Image.Image:
+    img = ImageOps.exif_transpose(img)
+    if img.mode not in ("RGB", "RGBA"):
+        has_alpha = img.mode in ("LA", "PA") or (img.mode == "P" and "transparency" in img.info)
+        img = img.convert("RGBA" if has_alpha else "RGB")
+    return img
+
+def _save(img: Image.Image, dest: str, fmt: str):
+    encoder, options = VARIANT_FORMATS[fmt]
+    tmp = f"{dest}.part"
+    try:
+        img.save(tmp, encoder, **options)
+        os.replace(tmp, dest)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+def make_variants(src: str, dests: List[str], widths: List[int], fmt: str = "webp") -> List[str]:
+    """Decode src once and write one resized variant per width (never upscaled).
+    dests[i] is the output path for widths[i]. Returns the paths written."""
+    written = []
+    with Image.open(src) as original:
+        img = _prepare(original)
+        for dest, width in sorted(zip(dests, widths), key=lambda pair: -pair[1]):
+            if img.width > width:
+                img = img.resize((width, max(1, round(img.height * width / img.width))), Image.LANCZOS)
+            _save(img, dest, fmt)
+            written.append(dest)
+    return written
+
+def image_metadata(src: str, placeholder_width: int = 16) -> dict:
+    """Intrinsic size, dominant colour and a tiny base64 WebP placeholder (LQIP)"""
+    with Image.open(src) as original:
+        img = _prepare(original)
+        width, height = img.size
+        img.thumbnail((placeholder_width, placeholder_width * 4), Image.BILINEAR)
+        small = img.convert("RGB")
+    
+    quantized = small.quantize(colors=4)
+    _, index = max(quantized.getcolors())
+    r, g, b = quantized.getpalette()[index * 3:index * 3 + 3]
+    
+    buf = io.BytesIO()
+    small.save(buf, "WEBP", quality=40)
+    return {
+        "width": width,
+        "height": height,
+        "dominant_color": f"#{r:02x}{g:02x}{b:02x}",
+        "placeholder": "data:image/webp;base64," + base64.b64encode(buf.getvalue()).decode()
+    }
@@ -0,0 +1,127 @@
+"""Request metrics in Prometheus text format.
+
+MetricsMiddleware is plain ASGI (no BaseHTTPMiddleware task overhead): per request it
+reads the clock twice, counts body bytes and updates a few dict entries. Routes are
+labelled by their template ("/api/services/{service_id}"), so label cardinality stays
+bounded. Numbers are per worker process.
+"""
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# (name, help, type, labels, value) for gauges/counters owned by the app (cache sizes, hit counts...)
+Sample = Tuple[str, str, str, Dict[str, str], float]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (f'{k}="{_escape(str(v))}"' for k, v in labels.items())
+    return "{" + ",".join(escaped) + "}"
+
+class MetricsRegistry:
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        # (method, route, status) -> [per-bucket counts..., +Inf count, sum of seconds]
+        self.latency: Dict[Tuple[str, str, str], List[float]] = {}
+        # (method, route) -> [request bytes, response bytes]
+        self.sizes: Dict[Tuple[str, str], List[int]] = {}
+        self.in_flight = 0
+
+    def observe(self, method: str, route: str, status: int, seconds: float, request_bytes: int, response_bytes: int):
+        key = (method, route, str(status))
+        series = self.latency.get(key)
+        if series is None:
+            series = self.latency[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, seconds)] += 1
+        series[-1] += seconds
+        sizes = self.sizes.get((method, route))
+        if sizes is None:
+            sizes = self.sizes[(method, route)] = [0, 0]
+        sizes[0] += request_bytes
+        sizes[1] += response_bytes
+
+    def render(self, extra: Iterable[Sample] = ()) -> str:
+        lines = [
+            "# HELP http_request_duration_seconds Request latency by route and status",
+            "# TYPE http_request_duration_seconds histogram"
+        ]
+        for (method, route, status), series in sorted(self.latency.items()):
+            base = {"method": method, "route": route, "status": status}
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"http_request_duration_seconds_bucket{_labels({**base, 'le': repr(bound)})} {cumulative}")
+            cumulative += series[len(self.buckets)]
+            lines.append(f"http_request_duration_seconds_bucket{_labels({**base, 'le': '+Inf'})} {cumulative}")
+            lines.append(f"http_request_duration_seconds_sum{_labels(base)} {series[-1]}")
+            lines.append(f"http_request_duration_seconds_count{_labels(base)} {cumulative}")
+
+        lines += [
+            "# HELP http_requests_in_flight Requests currently being handled",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {self.in_flight}",
+            "# HELP http_request_size_bytes_total Request body bytes received",
+            "# TYPE http_request_size_bytes_total counter"
+        ]
+        lines += [f"http_request_size_bytes_total{_labels({'method': m, 'route': r})} {s[0]}" for (m, r), s in sorted(self.sizes.items())]
+        lines += [
+            "# HELP http_response_size_bytes_total Response body bytes sent",
+            "# TYPE http_response_size_bytes_total counter"
+        ]
+        lines += [f"http_response_size_bytes_total{_labels({'method': m, 'route': r})} {s[1]}" for (m, r), s in sorted(self.sizes.items())]
+
+        described = set()
+        for name, help_text, kind, labels, value in extra:
+            if name not in described:
+                described.add(name)
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            lines.append(f"{name}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+class MetricsMiddleware:
+    def __init__(self, app, registry: MetricsRegistry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        registry = self.registry
+        state = {"status": 500, "request_bytes": 0, "response_bytes": 0}
+
+        async def counting_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                state["request_bytes"] += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                state["response_bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        registry.in_flight += 1
+        start = time.perf_counter()
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            elapsed = time.perf_counter() - start
+            registry.in_flight -= 1
+            # The router stores the matched route in the scope; unmatched paths share one label
+            route = scope.get("route")
+            registry.observe(
+                scope["method"],
+                getattr(route, "path_format", None) or getattr(route, "path", None) or "unmatched",
+                state["status"],
+                elapsed,
+                state["request_bytes"],
+                state["response_bytes"]
+            )
@@ -0,0 +1,132 @@
+"""In-process BM25 index over the studio's own content, used by the chatbot.
+
+The corpus is a few dozen short documents (services, projects, about/careers text,
+contact details), so term frequencies are kept in a dense NumPy matrix and a query
+scores every document in one vectorized pass. Documents can be added, replaced or
+removed one at a time without rebuilding the rest.
+"""
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+STOPWORDS = frozenset("""
+a an and are as at be by can could do does for from have how i in is it me my of on or our please
+tell that the this to us we what when where which who will with you your
+""".split())
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased alphanumeric terms without stopwords, with a plural "s" stripped"""
+    terms = []
+    for term in re.findall(r"[a-z0-9]+", text.lower()):
+        if term in STOPWORDS:
+            continue
+        if len(term) > 3 and term.endswith("s") and not term.endswith("ss"):
+            term = term[:-1]
+        terms.append(term)
+    return terms
+
+class BM25Index:
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocab: Dict[str, int] = {}
+        self.ids: List[str] = []
+        self.snippets: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self.tf = np.zeros((0, 0), dtype=np.float32)
+        self.lengths = np.zeros(0, dtype=np.float32)
+        self.df = np.zeros(0, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _grow_vocab(self, terms):
+        for term in terms:
+            if term not in self.vocab:
+                self.vocab[term] = len(self.vocab)
+        extra = len(self.vocab) - self.tf.shape[1]
+        if extra:
+            self.tf = np.pad(self.tf, ((0, 0), (0, extra)))
+            self.df = np.pad(self.df, (0, extra))
+
+    def upsert(self, doc_id: str, text: str, snippet: str):
+        """Index text under doc_id (replacing any previous version); snippet is what search returns"""
+        counts = Counter(tokenize(text))
+        self._grow_vocab(counts)
+        row = np.zeros(len(self.vocab), dtype=np.float32)
+        for term, count in counts.items():
+            row[self.vocab[term]] = count
+
+        r = self.rows.get(doc_id)
+        if r is None:
+            r = len(self.ids)
+            self.rows[doc_id] = r
+            self.ids.append(doc_id)
+            self.snippets.append(snippet)
+            self.tf = np.vstack([self.tf, row[None, :]])
+            self.lengths = np.append(self.lengths, row.sum())
+        else:
+            self.df -= self.tf[r] > 0
+            self.tf[r] = row
+            self.lengths[r] = row.sum()
+            self.snippets[r] = snippet
+        self.df += row > 0
+
+    def remove(self, doc_id: str):
+        r = self.rows.pop(doc_id, None)
+        if r is None:
+            return
+        self.df -= self.tf[r] > 0
+        last = len(self.ids) - 1
+        if r != last:
+            # Move the last document into the freed row
+            self.tf[r] = self.tf[last]
+            self.lengths[r] = self.lengths[last]
+            self.ids[r] = self.ids[last]
+            self.snippets[r] = self.snippets[last]
+            self.rows[self.ids[r]] = r
+        self.tf = self.tf[:last]
+        self.lengths = self.lengths[:last]
+        self.ids.pop()
+        self.snippets.pop()
+
+    def _scores(self, terms: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """BM25 score per document, plus the known query terms' column ids and idf weights"""
+        n = len(self.ids)
+        cols = np.array([self.vocab[t] for t in terms if t in self.vocab], dtype=np.int64)
+        if not n or not len(cols):
+            return np.zeros(n, dtype=np.float32), cols, np.zeros(0, dtype=np.float32)
+        df = self.df[cols]
+        idf = np.log1p((n - df + 0.5) / (df + 0.5))
+        tf = self.tf[:, cols]
+        avgdl = max(float(self.lengths.mean()), 1.0)
+        norm = self.k1 * (1 - self.b + self.b * self.lengths / avgdl)
+        scores = (idf * tf * (self.k1 + 1) / (tf + norm[:, None])).sum(axis=1)
+        return scores, cols, idf
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float, str]]:
+        """Top k (doc_id, score, snippet) with a positive score"""
+        scores, _, _ = self._scores(tokenize(query))
+        top = np.argsort(-scores)[:k]
+        return [(self.ids[i], float(scores[i]), self.snippets[i]) for i in top if scores[i] > 0]
+
+    def best_answer(self, query: str) -> Optional[Tuple[str, float, str]]:
+        """Best (doc_id, confidence, snippet), where confidence in [0, 1] is the idf-weighted share of
+        query terms the document contains, scaled by how far it outscores the runner-up"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        scores, cols, idf = self._scores(terms)
+        if not len(cols) or not scores.any():
+            return None
+        order = np.argsort(-scores)
+        best = order[0]
+        runner_up = scores[order[1]] if len(order) > 1 else 0.0
+
+        # Unknown query terms count against coverage with the largest possible idf
+        unknown = len(terms) - len(cols)
+        matched = float(idf[self.tf[best, cols] > 0].sum())
+        total = float(idf.sum()) + unknown * math.log1p(len(self.ids) + 0.5)
+        confidence = matched / total * (1 - runner_up / scores[best])
+        return self.ids[best], float(confidence), self.snippets[best]
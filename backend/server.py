@@ -1,10 +1,12 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File, Form, Request, BackgroundTasks
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response, StreamingResponse, RedirectResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure
 import os
 import logging
 import asyncio
@@ -18,6 +20,23 @@ import bcrypt
 import resend
 import random
 import string
+import time
+import math
+import re
+import hashlib
+import json
+from collections import OrderedDict
+import multiprocessing
+import tempfile
+import mimetypes
+from email.utils import formatdate, parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from image_processing import make_variants, image_metadata, avif_supported
+from storage import LocalStorage, S3Storage
+from chat_providers import ChatGateway, make_provider
+from retrieval import BM25Index, tokenize
+from metrics import MetricsMiddleware, MetricsRegistry
+import hmac
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -25,6 +44,9 @@ load_dotenv(ROOT_DIR / '.env')
 # Create uploads directory
 UPLOAD_DIR = ROOT_DIR / "uploads"
 UPLOAD_DIR.mkdir(exist_ok=True)
+# Scratch space for in-flight uploads and image processing, on the same filesystem as UPLOAD_DIR
+UPLOAD_TMP_DIR = UPLOAD_DIR / ".tmp"
+UPLOAD_TMP_DIR.mkdir(exist_ok=True)
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
@@ -40,6 +62,108 @@ ADMIN_PHONE = os.environ.get('ADMIN_PHONE', '9600130807')
 JWT_SECRET = os.environ.get('JWT_SECRET', 'hogwarts_secret')
 EMERGENT_LLM_KEY = os.environ.get('EMERGENT_LLM_KEY')
 
+# Media storage - "local" keeps files in UPLOAD_DIR, "s3" uses any S3-compatible bucket (AWS, MinIO...)
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'local')
+PRESIGNED_URL_TTL = int(os.environ.get('PRESIGNED_URL_TTL', '3600'))
+if STORAGE_BACKEND == "s3":
+    storage = S3Storage(
+        bucket=os.environ['S3_BUCKET'],
+        prefix=os.environ.get('S3_PREFIX', ''),
+        endpoint_url=os.environ.get('S3_ENDPOINT_URL'),
+        region=os.environ.get('S3_REGION'),
+        access_key=os.environ.get('S3_ACCESS_KEY_ID'),
+        secret_key=os.environ.get('S3_SECRET_ACCESS_KEY'),
+        public_base_url=os.environ.get('S3_PUBLIC_BASE_URL')
+    )
+else:
+    # Hashed two-level directories keep UPLOAD_DIR fast with tens of thousands of files
+    storage = LocalStorage(UPLOAD_DIR, sharded=os.environ.get('UPLOAD_SHARDING', 'true').lower() == 'true')
+upload_scratch = LocalStorage(UPLOAD_TMP_DIR)
+
+# Password hashing - bcrypt runs off the event loop on a dedicated pool
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', '4'))
+PASSWORD_HASH_EXECUTOR = os.environ.get('PASSWORD_HASH_EXECUTOR', 'thread')  # "thread" or "process"
+
+# Image derivatives - standard widths generated at upload time, decoded/encoded in a process pool
+IMAGE_VARIANT_WIDTHS = [320, 640, 1280]
+IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', '2'))
+IMAGE_AVIF_VARIANTS = os.environ.get('IMAGE_AVIF_VARIANTS', 'false').lower() == 'true'  # AVIF is slow to encode; opt-in
+
+# Orphaned upload GC - files unreferenced for longer than the grace period are deleted.
+# The periodic job is off unless UPLOAD_GC_INTERVAL_HOURS is set; the admin endpoint always works.
+UPLOAD_GC_GRACE_HOURS = float(os.environ.get('UPLOAD_GC_GRACE_HOURS', '24'))
+UPLOAD_GC_MIN_GRACE_HOURS = 1  # an upload needs time to be saved into the form that sent it
+UPLOAD_GC_SCRATCH_MIN_HOURS = 6  # temp files younger than this may belong to an upload or render in progress
+UPLOAD_GC_INTERVAL_HOURS = float(os.environ.get('UPLOAD_GC_INTERVAL_HOURS', '0'))
+UPLOAD_GC_BATCH_SIZE = int(os.environ.get('UPLOAD_GC_BATCH_SIZE', '500'))
+
+# Dashboard counters are kept with $inc on every write; this job recomputes them to fix drift (0 disables)
+STATS_RECONCILE_INTERVAL_HOURS = float(os.environ.get('STATS_RECONCILE_INTERVAL_HOURS', '6'))
+
+# Booking analytics read daily rollups; ranges are capped so a response stays small
+ANALYTICS_MAX_DAYS = int(os.environ.get('ANALYTICS_MAX_DAYS', '731'))
+ROLLUP_BACKFILL_BATCH_SIZE = int(os.environ.get('ROLLUP_BACKFILL_BATCH_SIZE', '1000'))
+ROLLUP_BACKFILL_LOCK_SECONDS = 1800
+
+# Currency assumed for prices written without a symbol, e.g. "500/hr"
+DEFAULT_PRICE_CURRENCY = os.environ.get('DEFAULT_PRICE_CURRENCY', 'INR')
+
+# Prometheus metrics on /api/metrics; scrapers authenticate with METRICS_TOKEN, people with an admin token
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# How long an admin's access level / suspension state is trusted before re-reading Mongo
+ADMIN_AUTH_CACHE_TTL = float(os.environ.get('ADMIN_AUTH_CACHE_TTL', '30'))
+
+# Max number of decoded JWTs kept in memory
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', '2048'))
+TOKEN_LIFETIME = timedelta(days=7)
+# Revocations are stored in Mongo; each worker polls for new ones this often
+TOKEN_REVOCATION_SYNC_SECONDS = float(os.environ.get('TOKEN_REVOCATION_SYNC_SECONDS', '5'))
+
+# Chatbot system prompt is cached in memory; edits rebuild it in this worker, the TTL bounds staleness in others
+CHAT_CONTEXT_TTL = float(os.environ.get('CHAT_CONTEXT_TTL', '300'))
+
+# "emergent" or "fake" (canned local replies for tests and offline load tests)
+CHAT_PROVIDER = os.environ.get('CHAT_PROVIDER', 'emergent')
+# litellm "provider/model"; CHAT_API_BASE overrides the endpoint (Emergent keys default to their proxy)
+CHAT_MODEL = os.environ.get('CHAT_MODEL', 'openai/gpt-5.2')
+CHAT_API_BASE = os.environ.get('CHAT_API_BASE') or None
+FAKE_LLM_LATENCY = float(os.environ.get('FAKE_LLM_LATENCY', '0'))
+FAKE_LLM_TOKEN_DELAY = float(os.environ.get('FAKE_LLM_TOKEN_DELAY', '0'))
+# First-turn answers are cached by normalized question and prompt version
+CHAT_CACHE_SIZE = int(os.environ.get('CHAT_CACHE_SIZE', '512'))
+CHAT_CACHE_TTL = float(os.environ.get('CHAT_CACHE_TTL', '3600'))
+CHAT_CACHE_MAX_QUESTION = 200
+
+# Retrieval over services, projects and site content: confident first-turn matches are answered without the LLM,
+# otherwise the top CHAT_RETRIEVAL_TOP_K snippets go into the prompt
+CHAT_RETRIEVAL_TOP_K = int(os.environ.get('CHAT_RETRIEVAL_TOP_K', '4'))
+CHAT_DIRECT_ANSWER_CONFIDENCE = float(os.environ.get('CHAT_DIRECT_ANSWER_CONFIDENCE', '0.6'))
+
+# Chat history: the last CHAT_SESSION_TURNS messages are replayed verbatim, older ones are folded into a short summary
+CHAT_SESSION_TURNS = int(os.environ.get('CHAT_SESSION_TURNS', '12'))
+CHAT_SESSION_TTL_HOURS = float(os.environ.get('CHAT_SESSION_TTL_HOURS', '24'))
+CHAT_TURN_MAX_CHARS = 1500
+CHAT_SUMMARY_MAX_CHARS = 1500
+
+# Bounds on in-flight LLM calls per worker; callers past the limits get the fallback reply straight away
+CHAT_MAX_CONCURRENCY = int(os.environ.get('CHAT_MAX_CONCURRENCY', '8'))
+CHAT_MAX_QUEUE = int(os.environ.get('CHAT_MAX_QUEUE', '32'))
+CHAT_QUEUE_TIMEOUT = float(os.environ.get('CHAT_QUEUE_TIMEOUT', '5'))
+CHAT_CALL_TIMEOUT = float(os.environ.get('CHAT_CALL_TIMEOUT', '30'))
+chat_provider = make_provider(CHAT_PROVIDER, api_key=EMERGENT_LLM_KEY, latency=FAKE_LLM_LATENCY, token_delay=FAKE_LLM_TOKEN_DELAY,
+                              model=CHAT_MODEL, api_base=CHAT_API_BASE)
+chat_gateway = ChatGateway(chat_provider, CHAT_MAX_CONCURRENCY, CHAT_MAX_QUEUE, CHAT_QUEUE_TIMEOUT, CHAT_CALL_TIMEOUT)
+
+# Rate limiting - "memory" is per worker, "mongo" shares buckets across uvicorn workers
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+# Number of reverse proxies in front of the app that append to X-Forwarded-For. 0 ignores the header,
+# since clients can put anything in it; behind one ingress set it to 1.
+TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', '0'))
+
 # Create the main app
 app = FastAPI()
 api_router = APIRouter(prefix="/api")
@@ -89,6 +213,10 @@ class ServiceCreate(BaseModel):
     description: str
     price: Optional[str] = None
     price_type: str = "project"
+    # Parsed from price when omitted
+    price_amount: Optional[float] = None
+    price_currency: Optional[str] = None
+    price_unit: Optional[str] = None
     icon: str = "mic"
     image_url: Optional[str] = None
     requires_hours: bool = False
@@ -98,6 +226,9 @@ class ServiceUpdate(BaseModel):
     description: Optional[str] = None
     price: Optional[str] = None
     price_type: Optional[str] = None
+    price_amount: Optional[float] = None
+    price_currency: Optional[str] = None
+    price_unit: Optional[str] = None
     icon: Optional[str] = None
     image_url: Optional[str] = None
     requires_hours: Optional[bool] = None
@@ -311,6 +442,10 @@ class SiteContentUpdate(BaseModel):
     booking_title: Optional[str] = None
     booking_subtitle: Optional[str] = None
 
+class PresignedUploadRequest(BaseModel):
+    filename: str
+    content_type: str
+
 class AdminApprovalRequest(BaseModel):
     email: EmailStr
     name: str
@@ -333,25 +468,125 @@ class JobApplicationCreate(BaseModel):
 # AUTH HELPERS
 # =========================
 
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+# bcrypt releases the GIL, so a thread pool is enough to keep the event loop free.
+# A process pool can be selected to isolate hashing from the API worker entirely.
+if PASSWORD_HASH_EXECUTOR == "process":
+    # Spawned rather than forked, like image_executor: forking copies Motor's monitor threads' locks
+    password_executor = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+else:
+    password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+
+def _bcrypt_hash(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=rounds)).decode()
 
-def verify_password(password: str, hashed: str) -> bool:
+def _bcrypt_check(password: str, hashed: str) -> bool:
     return bcrypt.checkpw(password.encode(), hashed.encode())
 
-def create_token(data: dict, expires_delta: timedelta = timedelta(days=7)) -> str:
+async def hash_password(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, _bcrypt_hash, password, BCRYPT_ROUNDS)
+
+async def verify_password(password: str, hashed: str) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, _bcrypt_check, password, hashed)
+
+def create_token(data: dict, expires_delta: timedelta = TOKEN_LIFETIME) -> str:
     to_encode = data.copy()
-    expire = datetime.now(timezone.utc) + expires_delta
-    to_encode.update({"exp": expire})
+    now = datetime.now(timezone.utc)
+    # iat keeps sub-second precision (PyJWT would truncate a datetime), so revocations compare exactly
+    to_encode.update({"exp": now + expires_delta, "iat": now.timestamp()})
     return jwt.encode(to_encode, JWT_SECRET, algorithm="HS256")
 
+# sha256(token) -> (exp, claims), least recently used first
+_token_cache: OrderedDict = OrderedDict()
+token_cache_stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "purged": 0}
+# "role:email" -> epoch seconds; tokens issued before this are rejected.
+# Mirrors the token_revocations collection, which every worker polls.
+_token_revocations: dict = {}
+_revocation_sync = {"since": 0.0}
+
+def _token_subject(claims: dict) -> str:
+    return f"{claims.get('role')}:{claims.get('email')}"
+
 def decode_token(token: str) -> dict:
+    key = hashlib.sha256(token.encode()).hexdigest()
+    cached = _token_cache.get(key)
+    if cached:
+        exp, claims = cached
+        if exp > time.time():
+            _token_cache.move_to_end(key)
+            token_cache_stats["hits"] += 1
+            return dict(claims)
+        del _token_cache[key]
+        token_cache_stats["expirations"] += 1
+        raise HTTPException(status_code=401, detail="Token expired")
+    token_cache_stats["misses"] += 1
+
     try:
-        return jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
+        claims = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
+    # Session tokens have no audience; anything scoped to another use (direct upload tokens) is not a login
+    if "aud" in claims or claims.get("purpose"):
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    revoked_before = _token_revocations.get(_token_subject(claims))
+    if revoked_before and claims.get("iat", 0) < revoked_before:
+        raise HTTPException(status_code=401, detail="Token revoked")
+
+    _token_cache[key] = (claims["exp"], claims)
+    while len(_token_cache) > TOKEN_CACHE_SIZE:
+        _token_cache.popitem(last=False)
+        token_cache_stats["evictions"] += 1
+    return dict(claims)
+
+def apply_token_revocation(subject: str, revoked_at: float):
+    """Record a revocation in this worker and drop the cached tokens it covers"""
+    if revoked_at <= _token_revocations.get(subject, 0):
+        return
+    _token_revocations[subject] = revoked_at
+    stale = [
+        key for key, (_, claims) in _token_cache.items()
+        if _token_subject(claims) == subject and claims.get("iat", 0) < revoked_at
+    ]
+    for key in stale:
+        del _token_cache[key]
+    token_cache_stats["purged"] += len(stale)
+
+async def revoke_tokens(role: str, email: str):
+    """Invalidate every outstanding token for an account (password reset, suspension, deletion).
+    Takes effect here at once and in other workers on their next revocation sync."""
+    subject = f"{role}:{email}"
+    revoked_at = time.time()
+    apply_token_revocation(subject, revoked_at)
+    await db.token_revocations.update_one(
+        {"_id": subject},
+        # Kept until every token issued before it has expired anyway
+        {"$max": {"revoked_at": revoked_at}, "$set": {"expires_at": datetime.now(timezone.utc) + TOKEN_LIFETIME}},
+        upsert=True
+    )
+
+async def sync_token_revocations():
+    """Apply revocations recorded by any worker since the last sync. The overlap window
+    covers writes from workers whose clocks run slightly behind."""
+    since = _revocation_sync["since"]
+    async for doc in db.token_revocations.find({"revoked_at": {"$gt": since - 60}}):
+        apply_token_revocation(doc["_id"], doc["revoked_at"])
+        since = max(since, doc["revoked_at"])
+    _revocation_sync["since"] = since
+    cutoff = time.time() - TOKEN_LIFETIME.total_seconds()
+    for subject in [s for s, revoked_at in _token_revocations.items() if revoked_at < cutoff]:
+        del _token_revocations[subject]
+
+async def token_revocation_sync_loop():
+    while True:
+        try:
+            await sync_token_revocations()
+        except Exception as e:
+            logger.error(f"Token revocation sync error: {str(e)}")
+        await asyncio.sleep(TOKEN_REVOCATION_SYNC_SECONDS)
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     if not credentials:
@@ -374,6 +609,26 @@ async def get_super_admin(credentials: HTTPAuthorizationCredentials = Depends(se
         raise HTTPException(status_code=403, detail="Super admin access required")
     return payload
 
+# admin_id -> (expires_at, auth state). Entries are dropped explicitly whenever a
+# super admin changes access, suspends or deletes an admin.
+_admin_auth_cache: dict = {}
+
+async def get_admin_auth_state(admin_id: str) -> Optional[dict]:
+    """Return {"access_level", "suspended"} for an admin, cached for ADMIN_AUTH_CACHE_TTL seconds"""
+    now = time.monotonic()
+    cached = _admin_auth_cache.get(admin_id)
+    if cached and cached[0] > now:
+        return cached[1]
+    admin = await db.admins.find_one({"id": admin_id}, {"_id": 0, "access_level": 1, "suspended": 1})
+    state = None
+    if admin:
+        state = {"access_level": admin.get("access_level", "basic"), "suspended": bool(admin.get("suspended"))}
+    _admin_auth_cache[admin_id] = (now + ADMIN_AUTH_CACHE_TTL, state)
+    return state
+
+def invalidate_admin_auth(admin_id: str):
+    _admin_auth_cache.pop(admin_id, None)
+
 async def get_admin_with_full_access(credentials: HTTPAuthorizationCredentials = Depends(security)):
     if not credentials:
         raise HTTPException(status_code=401, detail="Not authenticated")
@@ -382,14 +637,147 @@ async def get_admin_with_full_access(credentials: HTTPAuthorizationCredentials =
         raise HTTPException(status_code=403, detail="Admin access required")
     if payload.get("email") == SUPER_ADMIN_EMAIL:
         return payload
-    admin = await db.admins.find_one({"id": payload.get("admin_id")}, {"_id": 0})
-    if not admin or admin.get("access_level", "basic") not in ["full", "super"]:
+    admin = await get_admin_auth_state(payload.get("admin_id"))
+    if not admin or admin["access_level"] not in ["full", "super"]:
         raise HTTPException(status_code=403, detail="Full access required")
+    if admin["suspended"]:
+        raise HTTPException(status_code=403, detail="Your account has been suspended. Contact the super admin.")
     return payload
 
 def generate_otp() -> str:
     return ''.join(random.choices(string.digits, k=6))
 
+async def store_otp(email: str, otp_type: str, otp: str, expires: datetime, **extra):
+    """Replace the pending OTP of this type for an email with a single upsert.
+    Expired codes are removed by the TTL index on expires_at."""
+    query = {"email": email, "type": otp_type}
+    update = {"$set": {"otp": otp, "expires": expires.isoformat(), "expires_at": expires, **extra}}
+    try:
+        await db.otp_codes.update_one(query, update, upsert=True)
+    except DuplicateKeyError:
+        # A concurrent upsert inserted the row first (unique index on email, type); update that one
+        await db.otp_codes.update_one(query, update, upsert=True)
+
+# Only True is cached: another worker may create the first admin, so "no admins" is re-read
+# from Mongo every time. Set when an admin is created, reset when one is deleted.
+_admins_exist: Optional[bool] = None
+
+async def admins_exist() -> bool:
+    global _admins_exist
+    if not _admins_exist and await db.admins.find_one({}, {"_id": 1}) is not None:
+        _admins_exist = True
+    return bool(_admins_exist)
+
+def set_admins_exist(value: Optional[bool]):
+    global _admins_exist
+    _admins_exist = value
+
+# =========================
+# RATE LIMITING
+# =========================
+
+# policy -> (bucket capacity, tokens refilled per second)
+RATE_LIMIT_POLICIES = {
+    "admin_otp": (3, 3 / 600),       # admin registration OTP emails: 3 per 10 minutes
+    "resend_otp": (3, 3 / 600),      # resent registration OTPs: 3 per 10 minutes
+    "password_reset": (3, 3 / 600),  # password reset OTP emails: 3 per 10 minutes
+    "login": (10, 10 / 300),         # bcrypt-backed logins per IP: 10 per 5 minutes
+    "login_failure": (20, 20 / 900), # failed logins per account: 20 per 15 minutes, above the per-IP allowance
+    "booking": (5, 5 / 3600),   # booking enquiries: 5 per hour
+    "chat": (20, 20 / 60),      # LLM calls: 20 per minute
+}
+
+# key -> (tokens, last refill as time.monotonic())
+_rate_buckets: dict = {}
+_RATE_BUCKET_LIMIT = 50000
+_RATE_BUCKET_IDLE_SECONDS = 3600  # every policy is back to full capacity after an hour idle
+
+def client_ip(request: Request) -> str:
+    """The address the nearest trusted proxy saw. Entries left of that are client-supplied and ignored."""
+    if TRUSTED_PROXY_HOPS > 0:
+        hops = [h.strip() for h in request.headers.get("x-forwarded-for", "").split(",") if h.strip()]
+        if len(hops) >= TRUSTED_PROXY_HOPS:
+            return hops[-TRUSTED_PROXY_HOPS]
+    return request.client.host if request.client else "unknown"
+
+def _take_token_memory(key: str, capacity: float, rate: float, cost: int = 1) -> float:
+    """Consume `cost` tokens (0 just checks). Returns 0 if allowed, otherwise seconds until a token is available."""
+    now = time.monotonic()
+    if len(_rate_buckets) > _RATE_BUCKET_LIMIT:
+        for stale in [k for k, (_, t) in _rate_buckets.items() if now - t > _RATE_BUCKET_IDLE_SECONDS]:
+            del _rate_buckets[stale]
+    tokens, updated = _rate_buckets.get(key, (capacity, now))
+    tokens = min(capacity, tokens + (now - updated) * rate)
+    if tokens >= 1:
+        _rate_buckets[key] = (tokens - cost, now)
+        return 0.0
+    _rate_buckets[key] = (tokens, now)
+    return (1 - tokens) / rate
+
+async def _take_token_mongo(key: str, capacity: float, rate: float, cost: int = 1) -> float:
+    """Same as _take_token_memory, as one atomic pipeline update on the rate_limits collection"""
+    now = time.time()
+    expires = datetime.now(timezone.utc) + timedelta(seconds=capacity / rate)
+    refilled = {"$min": [capacity, {"$add": [
+        {"$ifNull": ["$tokens", capacity]},
+        {"$multiply": [{"$subtract": [now, {"$ifNull": ["$updated", now]}]}, rate]}
+    ]}]}
+    doc = await db.rate_limits.find_one_and_update(
+        {"_id": key},
+        [
+            {"$set": {"tokens": refilled, "updated": now}},
+            {"$set": {"allowed": {"$gte": ["$tokens", 1]}}},
+            {"$set": {"tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", cost]}, "$tokens"]}, "expires_at": expires}}
+        ],
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    if doc["allowed"]:
+        return 0.0
+    return (1 - doc["tokens"]) / rate
+
+async def take_rate_token(key: str, policy: str, cost: int = 1) -> float:
+    capacity, rate = RATE_LIMIT_POLICIES[policy]
+    if RATE_LIMIT_BACKEND == "mongo":
+        try:
+            return await _take_token_mongo(key, capacity, rate, cost)
+        except Exception as e:
+            logger.error(f"Rate limit store error: {str(e)}")
+    return _take_token_memory(key, capacity, rate, cost)
+
+def too_many_requests(wait: float) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail="Too many requests. Please try again later.",
+        headers={"Retry-After": str(math.ceil(wait))}
+    )
+
+async def enforce_rate_limit(request: Request, policy: str, email: Optional[str] = None):
+    """Throttle by client IP and, when given, by target email. Raises 429 with Retry-After."""
+    if not RATE_LIMIT_ENABLED:
+        return
+    keys = [f"{policy}:ip:{client_ip(request)}"]
+    if email:
+        keys.append(f"{policy}:email:{email.lower()}")
+    
+    for key in keys:
+        wait = await take_rate_token(key, policy)
+        if wait > 0:
+            raise too_many_requests(wait)
+
+async def check_login_failures(email: str):
+    """Refuse an attempt on an account that has used up its failed-login allowance. Only failures
+    are charged (see record_login_failure), so successful logins never lock the owner out."""
+    if not RATE_LIMIT_ENABLED:
+        return
+    wait = await take_rate_token(f"login_failure:email:{email.lower()}", "login_failure", cost=0)
+    if wait > 0:
+        raise too_many_requests(wait)
+
+async def record_login_failure(email: str):
+    if RATE_LIMIT_ENABLED:
+        await take_rate_token(f"login_failure:email:{email.lower()}", "login_failure")
+
 # =========================
 # EMAIL HELPERS
 # =========================
@@ -542,52 +930,527 @@ async def send_admin_notification(booking: dict):
 # FILE UPLOAD
 # =========================
 
+MAX_IMAGE_SIZE = 5 * 1024 * 1024
+MAX_CV_SIZE = 10 * 1024 * 1024  # 10MB limit for CVs
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+class UploadTooLarge(Exception):
+    pass
+
+def _copy_upload(src, tmp: Path, max_bytes: int):
+    """Copy a spooled upload to tmp in chunks, hashing it on the way.
+    Runs in a worker thread; stops reading as soon as max_bytes is exceeded.
+    Returns (size, sha256 hex digest)."""
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp, "wb") as out:
+            while True:
+                chunk = src.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge()
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return size, digest.hexdigest()
+
+def _commit_upload(tmp: Path, key: str, content_type: Optional[str]) -> bool:
+    """Move tmp into storage under key, or drop it if key already holds the same content"""
+    if storage.exists(key):
+        tmp.unlink(missing_ok=True)
+        return False
+    storage.put_file(tmp, key, content_type)
+    return True
+
+async def save_upload(file: UploadFile, prefix: str, ext: str, max_bytes: int, content_type: Optional[str] = None):
+    """Stream an UploadFile into content-addressed storage off the event loop.
+    The stored name is {prefix}{sha256}.{ext}; the uploads collection maps each digest to
+    one file, so identical uploads share it. Returns (filename, is_new_file)."""
+    too_large = HTTPException(status_code=400, detail=f"File size must be less than {max_bytes // (1024 * 1024)}MB")
+    if file.size is not None and file.size > max_bytes:
+        raise too_large
+    await file.seek(0)
+    tmp = UPLOAD_TMP_DIR / f"{uuid.uuid4()}.part"
+    try:
+        size, digest = await asyncio.to_thread(_copy_upload, file.file, tmp, max_bytes)
+    except UploadTooLarge:
+        raise too_large
+    
+    try:
+        mapping = await db.uploads.find_one_and_update(
+            {"_id": digest},
+            {
+                "$setOnInsert": {
+                    "filename": f"{prefix}{digest}.{ext}",
+                    "size": size,
+                    "content_type": content_type or file.content_type,
+                    "created_at": datetime.now(timezone.utc).isoformat()
+                },
+                # A duplicate reuses the stored file as-is, so its mtime can be old; the GC goes by this instead
+                "$set": {"last_uploaded_at": datetime.now(timezone.utc)}
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    filename = mapping["filename"]
+    is_new = await asyncio.to_thread(_commit_upload, tmp, filename, mapping.get("content_type"))
+    return filename, is_new
+
+# Spawned rather than forked: the API worker has Mongo monitor threads running
+image_executor = ProcessPoolExecutor(max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+IMAGE_EXTENSIONS = {"jpg", "jpeg", "png", "webp", "gif", "bmp", "tiff"}
+AVIF_SUPPORTED = avif_supported()
+# Formats rendered at upload time, best first. WebP is always among them.
+VARIANT_FORMATS = ["avif", "webp"] if IMAGE_AVIF_VARIANTS and AVIF_SUPPORTED else ["webp"]
+
+VARIANT_PREFIX = "variants/"
+
+def variant_key(filename: str, width: int, fmt: str) -> str:
+    return f"{VARIANT_PREFIX}{Path(filename).stem}_w{width}.{fmt}"
+
+def pick_variant_width(requested: Optional[int]) -> int:
+    """Snap a requested width to the smallest standard width that covers it"""
+    if not requested:
+        return IMAGE_VARIANT_WIDTHS[-1]
+    for width in IMAGE_VARIANT_WIDTHS:
+        if width >= requested:
+            return width
+    return IMAGE_VARIANT_WIDTHS[-1]
+
+async def generate_image_variants(filename: str, widths: List[int], fmt: str = "webp") -> bool:
+    """Render variants of an uploaded image in the process pool and store them.
+    Returns False if Pillow can't decode the image."""
+    loop = asyncio.get_running_loop()
+    try:
+        with tempfile.TemporaryDirectory(dir=UPLOAD_TMP_DIR) as work:
+            src = storage.local_path(filename)
+            if src is None:
+                src = Path(work) / filename
+                await asyncio.to_thread(storage.fetch_to, filename, src)
+            keys = [variant_key(filename, width, fmt) for width in widths]
+            dests = [Path(work) / Path(key).name for key in keys]
+            await loop.run_in_executor(image_executor, make_variants, str(src), [str(d) for d in dests], widths, fmt)
+            for dest, key in zip(dests, keys):
+                await asyncio.to_thread(storage.put_file, dest, key, f"image/{fmt}")
+        return True
+    except Exception as e:
+        logger.warning(f"Image variant error for {filename}: {str(e)}")
+        return False
+
+_variant_renders: dict = {}
+
+async def render_variant_once(filename: str, width: int, fmt: str) -> bool:
+    """On-demand render shared by concurrent requests for the same variant"""
+    key = variant_key(filename, width, fmt)
+    task = _variant_renders.get(key)
+    if task is None:
+        task = asyncio.create_task(generate_image_variants(filename, [width], fmt))
+        _variant_renders[key] = task
+        task.add_done_callback(lambda _: _variant_renders.pop(key, None))
+    return await asyncio.shield(task)
+
+async def compute_image_meta(filename: str) -> Optional[dict]:
+    loop = asyncio.get_running_loop()
+    try:
+        with tempfile.TemporaryDirectory(dir=UPLOAD_TMP_DIR) as work:
+            src = storage.local_path(filename)
+            if src is None:
+                src = Path(work) / filename
+                await asyncio.to_thread(storage.fetch_to, filename, src)
+            return await loop.run_in_executor(image_executor, image_metadata, str(src))
+    except Exception as e:
+        logger.warning(f"Image metadata error for {filename}: {str(e)}")
+        return None
+
+async def process_uploaded_image(filename: str):
+    """Background work after an image upload: variants, then size/colour/placeholder metadata.
+    The metadata is kept on the upload record and copied to any service or project already using it."""
+    for fmt in reversed(VARIANT_FORMATS):
+        await generate_image_variants(filename, IMAGE_VARIANT_WIDTHS, fmt)
+    meta = await compute_image_meta(filename)
+    if not meta:
+        return
+    await db.uploads.update_one({"filename": filename}, {"$set": {"image_meta": meta}}, upsert=True)
+    url = f"/api/uploads/{filename}"
+    await db.services.update_many({"image_url": url}, {"$set": {"image_meta": meta}})
+    await db.projects.update_many({"image_url": url}, {"$set": {"image_meta": meta}})
+
+async def image_meta_for(image_url: Optional[str]) -> Optional[dict]:
+    """Stored metadata for an /api/uploads image URL, if it has been computed"""
+    match = UPLOAD_URL_PATTERN.search(image_url or "")
+    if not match:
+        return None
+    upload = await db.uploads.find_one({"filename": match.group(1)}, {"_id": 0, "image_meta": 1})
+    return upload.get("image_meta") if upload else None
+
 @api_router.post("/upload/image")
-async def upload_image(file: UploadFile = File(...), admin: dict = Depends(get_admin_with_full_access)):
+async def upload_image(background_tasks: BackgroundTasks, file: UploadFile = File(...), admin: dict = Depends(get_admin_with_full_access)):
     if not file.content_type or not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="File must be an image")
     
-    content = await file.read()
-    if len(content) > 5 * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="File size must be less than 5MB")
-    
     ext = file.filename.split(".")[-1] if "." in file.filename else "jpg"
-    filename = f"{uuid.uuid4()}.{ext}"
-    filepath = UPLOAD_DIR / filename
+    filename, is_new = await save_upload(file, "", ext, MAX_IMAGE_SIZE)
     
-    with open(filepath, "wb") as f:
-        f.write(content)
+    if is_new and ext.lower() in IMAGE_EXTENSIONS:
+        background_tasks.add_task(process_uploaded_image, filename)
     
     # Return the API URL path that will work
     return {"url": f"/api/uploads/{filename}", "filename": filename}
 
+# Upload names never change content (content-addressed or random), so browsers may cache forever
+UPLOAD_CACHE_CONTROL = "public, max-age=31536000, immutable"
+MAX_RANGES = 32
+
+def _parse_ranges(header: str, size: int):
+    """Parse a bytes Range header into [(start, end_inclusive)].
+    Returns None if the header should be ignored, [] if nothing is satisfiable."""
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec:
+        return None
+    ranges = []
+    for part in spec.split(","):
+        first, sep, last = part.strip().partition("-")
+        if not sep:
+            return None
+        try:
+            if first:
+                start = int(first)
+                end = int(last) if last else size - 1
+            else:
+                start = max(0, size - int(last))
+                end = size - 1
+        except ValueError:
+            return None
+        if start > end and first and last:
+            return None
+        if start < size:
+            ranges.append((start, min(end, size - 1)))
+    if len(ranges) > MAX_RANGES:
+        return None
+    return ranges
+
+async def _iter_file_ranges(path: Path, ranges, boundary: Optional[str], media_type: str, size: int):
+    fd = await asyncio.to_thread(os.open, path, os.O_RDONLY)
+    try:
+        for start, end in ranges:
+            if boundary:
+                yield f"--{boundary}\r\nContent-Type: {media_type}\r\nContent-Range: bytes {start}-{end}/{size}\r\n\r\n".encode()
+            offset = start
+            while offset <= end:
+                chunk = await asyncio.to_thread(os.pread, fd, min(UPLOAD_CHUNK_SIZE, end - offset + 1), offset)
+                if not chunk:
+                    break
+                offset += len(chunk)
+                yield chunk
+            if boundary:
+                yield b"\r\n"
+        if boundary:
+            yield f"--{boundary}--\r\n".encode()
+    finally:
+        os.close(fd)
+
+async def serve_file(request: Request, path: Path, media_type: Optional[str] = None, vary: Optional[str] = None):
+    """FileResponse with immutable caching, ETag/Last-Modified revalidation (304) and
+    single or multi-part byte ranges (206)"""
+    stat = await asyncio.to_thread(os.stat, path)
+    media_type = media_type or mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+    headers = {
+        "Cache-Control": UPLOAD_CACHE_CONTROL,
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Accept-Ranges": "bytes"
+    }
+    if vary:
+        headers["Vary"] = vary
+    
+    # Conditional GET - If-None-Match takes precedence over If-Modified-Since
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if "*" in tags or etag in tags:
+            return Response(status_code=304, headers=headers)
+    elif request.headers.get("if-modified-since"):
+        try:
+            since = parsedate_to_datetime(request.headers["if-modified-since"]).timestamp()
+            if int(stat.st_mtime) <= since:
+                return Response(status_code=304, headers=headers)
+        except (TypeError, ValueError):
+            pass
+    
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range in (etag, headers["Last-Modified"])):
+        size = stat.st_size
+        ranges = _parse_ranges(range_header, size)
+        if ranges == []:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        if ranges:
+            if len(ranges) == 1:
+                start, end = ranges[0]
+                headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+                headers["Content-Length"] = str(end - start + 1)
+                body = _iter_file_ranges(path, ranges, None, media_type, size)
+                return StreamingResponse(body, status_code=206, headers=headers, media_type=media_type)
+            boundary = uuid.uuid4().hex
+            length = 0
+            for start, end in ranges:
+                length += len(f"--{boundary}\r\nContent-Type: {media_type}\r\nContent-Range: bytes {start}-{end}/{size}\r\n\r\n")
+                length += end - start + 1 + 2
+            length += len(f"--{boundary}--\r\n")
+            headers["Content-Length"] = str(length)
+            body = _iter_file_ranges(path, ranges, boundary, media_type, size)
+            return StreamingResponse(body, status_code=206, headers=headers, media_type=f"multipart/byteranges; boundary={boundary}")
+    
+    return FileResponse(path, media_type=media_type, headers=headers, stat_result=stat)
+
+async def serve_upload(request: Request, key: str, media_type: Optional[str] = None, vary: Optional[str] = None):
+    """Serve a stored object from local disk, or redirect to a presigned storage URL"""
+    path = storage.local_path(key)
+    if path is not None:
+        return await serve_file(request, path, media_type=media_type, vary=vary)
+    url = await asyncio.to_thread(storage.download_url, key, PRESIGNED_URL_TTL)
+    headers = {"Cache-Control": f"private, max-age={PRESIGNED_URL_TTL // 2}"}
+    if vary:
+        headers["Vary"] = vary
+    return RedirectResponse(url, status_code=307, headers=headers)
+
+def is_valid_upload_name(filename: str) -> bool:
+    return bool(filename) and not filename.startswith(".") and "/" not in filename
+
 @api_router.get("/uploads/{filename}")
-async def get_upload(filename: str):
-    filepath = UPLOAD_DIR / filename
-    if not filepath.exists():
+async def get_upload(filename: str, request: Request, w: Optional[int] = None):
+    """Serve an upload. Images are swapped for a resized WebP (or AVIF, if enabled) variant when
+    the browser accepts one; ?w= picks the variant width. Only a missing WebP variant is rendered
+    on demand - AVIF is never encoded on the request path."""
+    if not is_valid_upload_name(filename) or not await asyncio.to_thread(storage.exists, filename):
         raise HTTPException(status_code=404, detail="File not found")
-    return FileResponse(filepath)
+    
+    ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    if ext not in IMAGE_EXTENSIONS:
+        return await serve_upload(request, filename)
+    
+    accept = request.headers.get("accept", "")
+    formats = [fmt for fmt in VARIANT_FORMATS if f"image/{fmt}" in accept]
+    if not formats:
+        return await serve_upload(request, filename, vary="Accept")
+    
+    width = pick_variant_width(w)
+    for fmt in formats:
+        key = variant_key(filename, width, fmt)
+        if await asyncio.to_thread(storage.exists, key):
+            return await serve_upload(request, key, media_type=f"image/{fmt}", vary="Accept")
+    fmt = "webp"
+    key = variant_key(filename, width, fmt)
+    if fmt not in formats or not await render_variant_once(filename, width, fmt):
+        return await serve_upload(request, filename, vary="Accept")
+    return await serve_upload(request, key, media_type=f"image/{fmt}", vary="Accept")
+
+@api_router.get("/uploads/{filename}/url")
+async def get_upload_download_url(filename: str):
+    """Direct download URL for an upload - presigned when the storage backend supports it"""
+    if not is_valid_upload_name(filename) or not await asyncio.to_thread(storage.exists, filename):
+        raise HTTPException(status_code=404, detail="File not found")
+    url = await asyncio.to_thread(storage.download_url, filename, PRESIGNED_URL_TTL)
+    return {"url": url or f"/api/uploads/{filename}", "expires_in": PRESIGNED_URL_TTL if url else None}
 
 @api_router.post("/upload/cv")
 async def upload_cv(file: UploadFile = File(...)):
     """Upload CV/Resume file (PDF only, public endpoint for job applications)"""
-    allowed_types = ["application/pdf", "application/msword", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"]
-    if not file.content_type or file.content_type not in allowed_types:
+    if not file.content_type or file.content_type not in CV_CONTENT_TYPES:
         raise HTTPException(status_code=400, detail="File must be a PDF or Word document")
     
-    content = await file.read()
-    if len(content) > 10 * 1024 * 1024:  # 10MB limit for CVs
-        raise HTTPException(status_code=400, detail="File size must be less than 10MB")
-    
     ext = file.filename.split(".")[-1] if "." in file.filename else "pdf"
-    filename = f"cv_{uuid.uuid4()}.{ext}"
-    filepath = UPLOAD_DIR / filename
-    
-    with open(filepath, "wb") as f:
-        f.write(content)
+    filename, _ = await save_upload(file, "cv_", ext, MAX_CV_SIZE)
     
     return {"url": f"/api/uploads/{filename}", "filename": filename, "original_name": file.filename}
 
+# =========================
+# DIRECT UPLOADS
+# =========================
+
+# Upload tokens carry this audience, which session token checks never accept
+UPLOAD_TOKEN_AUDIENCE = "hogwarts:direct-upload"
+CV_CONTENT_TYPES = ["application/pdf", "application/msword", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"]
+
+async def presign_upload(key: str, content_type: str, max_bytes: int) -> dict:
+    """Describe a browser multipart POST that uploads straight to storage. Direct uploads skip
+    the SHA-256 dedup since the API never sees the bytes."""
+    target = await asyncio.to_thread(storage.presigned_upload, key, content_type, max_bytes, PRESIGNED_URL_TTL)
+    if target is None:
+        # Local disk has no storage endpoint of its own - the target is this API, authorised by a signed token
+        token = create_token(
+            {"aud": UPLOAD_TOKEN_AUDIENCE, "purpose": "direct_upload", "key": key, "content_type": content_type, "max_bytes": max_bytes},
+            timedelta(seconds=PRESIGNED_URL_TTL)
+        )
+        target = {"url": "/api/uploads/direct", "fields": {"token": token}}
+    return {
+        "upload": {"method": "POST", "url": target["url"], "fields": target["fields"]},
+        "filename": key,
+        "url": f"/api/uploads/{key}",
+        "expires_in": PRESIGNED_URL_TTL
+    }
+
+@api_router.post("/upload/image/presign")
+async def presign_image_upload(data: PresignedUploadRequest, admin: dict = Depends(get_admin_with_full_access)):
+    if not data.content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail="File must be an image")
+    ext = data.filename.split(".")[-1] if "." in data.filename else "jpg"
+    return await presign_upload(f"{uuid.uuid4()}.{ext}", data.content_type, MAX_IMAGE_SIZE)
+
+@api_router.post("/upload/cv/presign")
+async def presign_cv_upload(data: PresignedUploadRequest):
+    """Presigned CV upload (public endpoint for job applications)"""
+    if data.content_type not in CV_CONTENT_TYPES:
+        raise HTTPException(status_code=400, detail="File must be a PDF or Word document")
+    ext = data.filename.split(".")[-1] if "." in data.filename else "pdf"
+    return await presign_upload(f"cv_{uuid.uuid4()}.{ext}", data.content_type, MAX_CV_SIZE)
+
+@api_router.post("/uploads/direct")
+async def direct_upload(background_tasks: BackgroundTasks, token: str = Form(...), file: UploadFile = File(...)):
+    """Upload target handed out by presign_upload when storage is on local disk"""
+    try:
+        claims = jwt.decode(token, JWT_SECRET, algorithms=["HS256"], audience=UPLOAD_TOKEN_AUDIENCE)
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=403, detail="Invalid or expired upload token")
+    if claims.get("purpose") != "direct_upload":
+        raise HTTPException(status_code=403, detail="Invalid or expired upload token")
+    
+    key = claims["key"]
+    max_bytes = claims["max_bytes"]
+    too_large = HTTPException(status_code=400, detail=f"File size must be less than {max_bytes // (1024 * 1024)}MB")
+    if file.size is not None and file.size > max_bytes:
+        raise too_large
+    await file.seek(0)
+    tmp = UPLOAD_TMP_DIR / f"{uuid.uuid4()}.part"
+    try:
+        await asyncio.to_thread(_copy_upload, file.file, tmp, max_bytes)
+    except UploadTooLarge:
+        raise too_large
+    await asyncio.to_thread(storage.put_file, tmp, key, claims.get("content_type"))
+    if key.rsplit(".", 1)[-1].lower() in IMAGE_EXTENSIONS:
+        background_tasks.add_task(process_uploaded_image, key)
+    return {"url": f"/api/uploads/{key}", "filename": key}
+
+# =========================
+# UPLOAD GARBAGE COLLECTION
+# =========================
+
+# Collections whose documents can point at uploads, e.g. image_url, logo_url, background_value, cv_filename
+UPLOAD_REFERENCE_COLLECTIONS = ["services", "projects", "applications", "site_content", "site_settings", "contact_info"]
+UPLOAD_URL_PATTERN = re.compile(r"/uploads/([^/?#\s\"']+)")
+GC_REPORT_LIMIT = 1000
+
+def _collect_upload_refs(value, key: str, refs: set):
+    if isinstance(value, str):
+        refs.update(UPLOAD_URL_PATTERN.findall(value))
+        if key.endswith("filename") and value:
+            refs.add(value)
+    elif isinstance(value, dict):
+        for k, v in value.items():
+            _collect_upload_refs(v, k, refs)
+    elif isinstance(value, list):
+        for v in value:
+            _collect_upload_refs(v, key, refs)
+
+async def referenced_upload_names() -> set:
+    """Every upload filename referenced from the database, streamed collection by collection"""
+    refs = set()
+    for name in UPLOAD_REFERENCE_COLLECTIONS:
+        async for doc in db[name].find({}, {"_id": 0}):
+            _collect_upload_refs(doc, "", refs)
+    return refs
+
+async def _iter_storage_batches(store, prefix: str):
+    """Yield [(key, mtime, size)] batches from a storage backend without listing it all at once"""
+    batches = store.iter_batches(prefix, UPLOAD_GC_BATCH_SIZE)
+    while True:
+        batch = await asyncio.to_thread(next, batches, None)
+        if batch is None:
+            break
+        yield batch
+
+async def collect_orphaned_uploads(dry_run: bool = True, grace_hours: float = UPLOAD_GC_GRACE_HOURS) -> dict:
+    """Delete uploads (and their image variants) that nothing references and that are
+    older than the grace period. Stale temp files from interrupted uploads are swept too."""
+    grace_hours = max(grace_hours, UPLOAD_GC_MIN_GRACE_HOURS)
+    refs = await referenced_upload_names()
+    cutoff = time.time() - grace_hours * 3600
+    scratch_cutoff = time.time() - max(grace_hours, UPLOAD_GC_SCRATCH_MIN_HOURS) * 3600
+    cutoff_dt = datetime.fromtimestamp(cutoff, timezone.utc)
+    # Re-uploads of an existing file within the grace period keep it (and its variants) alive
+    recent = {doc["filename"] async for doc in db.uploads.find({"last_uploaded_at": {"$gte": cutoff_dt}}, {"_id": 0, "filename": 1})}
+    keep = refs | recent
+    referenced_stems = {Path(name).stem for name in keep}
+    report = {"dry_run": dry_run, "grace_hours": grace_hours, "referenced": len(refs),
+              "scanned": 0, "orphaned": 0, "bytes": 0, "files": []}
+    
+    async def sweep(store, prefix: str, is_orphan, older_than: float = cutoff):
+        async for batch in _iter_storage_batches(store, prefix):
+            report["scanned"] += len(batch)
+            orphans = [(key, size) for key, mtime, size in batch if mtime < older_than and is_orphan(key)]
+            if orphans and store is storage and not prefix:
+                # Check again just before deleting, for duplicates uploaded while the GC was running
+                reuploaded = {doc["filename"] async for doc in db.uploads.find(
+                    {"filename": {"$in": [key for key, _ in orphans]}, "last_uploaded_at": {"$gte": cutoff_dt}},
+                    {"_id": 0, "filename": 1}
+                )}
+                orphans = [(key, size) for key, size in orphans if key not in reuploaded]
+            report["orphaned"] += len(orphans)
+            report["bytes"] += sum(size for _, size in orphans)
+            room = GC_REPORT_LIMIT - len(report["files"])
+            report["files"].extend(key for key, _ in orphans[:max(room, 0)])
+            if orphans and not dry_run:
+                keys = [key for key, _ in orphans]
+                await asyncio.to_thread(store.delete_many, keys)
+                if store is storage and not prefix:
+                    await db.uploads.delete_many({"filename": {"$in": keys}})
+            await asyncio.sleep(0)
+    
+    await sweep(storage, "", lambda key: key not in keep)
+    # Variants are stored as variants/{original stem}_w{width}.{fmt}
+    await sweep(storage, VARIANT_PREFIX, lambda key: key[len(VARIANT_PREFIX):].rsplit("_w", 1)[0] not in referenced_stems)
+    await sweep(upload_scratch, "", lambda key: True, scratch_cutoff)
+    
+    action = "Would delete" if dry_run else "Deleted"
+    logger.info(f"Upload GC: {action} {report['orphaned']} of {report['scanned']} files ({report['bytes']} bytes)")
+    return report
+
+async def migrate_upload_layout():
+    """Move files from the old flat UPLOAD_DIR layout into shard directories, a batch at a time.
+    URLs are unaffected - LocalStorage resolves both layouts."""
+    total = 0
+    for prefix in ("", VARIANT_PREFIX):
+        while True:
+            moved = await asyncio.to_thread(storage.migrate_flat, prefix, UPLOAD_GC_BATCH_SIZE)
+            total += moved
+            if moved < UPLOAD_GC_BATCH_SIZE:
+                break
+            await asyncio.sleep(0.1)
+    if total:
+        logger.info(f"Moved {total} uploads into the sharded layout")
+
+async def upload_gc_loop():
+    while True:
+        await asyncio.sleep(UPLOAD_GC_INTERVAL_HOURS * 3600)
+        try:
+            await collect_orphaned_uploads(dry_run=False)
+        except Exception as e:
+            logger.error(f"Upload GC error: {str(e)}")
+
+@api_router.post("/admin/uploads/gc")
+async def run_upload_gc(dry_run: bool = True, grace_hours: Optional[float] = None, super_admin: dict = Depends(get_super_admin)):
+    """Report (dry run, default) or delete orphaned uploads (Super admin only)"""
+    return await collect_orphaned_uploads(dry_run=dry_run, grace_hours=UPLOAD_GC_GRACE_HOURS if grace_hours is None else grace_hours)
+
 # =========================
 # USER AUTH
 # =========================
@@ -602,17 +1465,21 @@ async def register_user(user: UserCreate):
         "id": str(uuid.uuid4()),
         "name": user.name,
         "email": user.email,
-        "password": hash_password(user.password),
+        "password": await hash_password(user.password),
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     await db.users.insert_one(user_doc)
+    await bump_stats({"users": 1})
     token = create_token({"user_id": user_doc["id"], "email": user.email, "role": "user"})
     return {"token": token, "user": {"id": user_doc["id"], "name": user.name, "email": user.email}}
 
 @api_router.post("/auth/login")
-async def login_user(data: UserLogin):
+async def login_user(data: UserLogin, request: Request):
+    await enforce_rate_limit(request, "login")
+    await check_login_failures(data.email)
     user = await db.users.find_one({"email": data.email}, {"_id": 0})
-    if not user or not verify_password(data.password, user["password"]):
+    if not user or not await verify_password(data.password, user["password"]):
+        await record_login_failure(data.email)
         raise HTTPException(status_code=401, detail="Invalid credentials")
     token = create_token({"user_id": user["id"], "email": user["email"], "role": "user"})
     return {"token": token, "user": {"id": user["id"], "name": user["name"], "email": user["email"]}}
@@ -635,30 +1502,26 @@ async def get_me(current_user: dict = Depends(get_current_user)):
 # =========================
 
 @api_router.post("/admin/request-otp")
-async def request_admin_otp(data: AdminOTPRequest):
+async def request_admin_otp(data: AdminOTPRequest, request: Request):
     """Request OTP for admin registration. 
     For super admin email: OTP goes directly to them.
     For other emails: OTP goes to super admin for approval."""
+    await enforce_rate_limit(request, "admin_otp", data.email)
     
-    existing_admin = await db.admins.find_one({}, {"_id": 0})
-    if not existing_admin and data.email != SUPER_ADMIN_EMAIL:
+    has_admins = await admins_exist()
+    if not has_admins and data.email != SUPER_ADMIN_EMAIL:
         raise HTTPException(status_code=403, detail="First admin must be the super admin email")
     
     # Check if admin already exists
-    existing = await db.admins.find_one({"email": data.email}, {"_id": 0})
-    if existing:
-        raise HTTPException(status_code=400, detail="This email is already registered as an admin")
+    if has_admins:
+        existing = await db.admins.find_one({"email": data.email}, {"_id": 1})
+        if existing:
+            raise HTTPException(status_code=400, detail="This email is already registered as an admin")
     
     otp = generate_otp()
     expires = datetime.now(timezone.utc) + timedelta(minutes=30)  # Longer expiry for approval
     
-    await db.otp_codes.delete_many({"email": data.email, "type": "admin_registration"})
-    await db.otp_codes.insert_one({
-        "email": data.email, 
-        "otp": otp, 
-        "expires": expires.isoformat(),
-        "type": "admin_registration"
-    })
+    await store_otp(data.email, "admin_registration", otp, expires)
     
     if data.email == SUPER_ADMIN_EMAIL:
         # Super admin gets OTP directly
@@ -721,21 +1584,26 @@ async def verify_admin_otp(data: AdminOTPVerify):
         "id": str(uuid.uuid4()),
         "name": data.name,
         "email": data.email,
-        "password": hash_password(data.password),
+        "password": await hash_password(data.password),
         "access_level": "super" if is_super else "basic",  # Default to basic for non-super admins
         "suspended": False,
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     await db.admins.insert_one(admin_doc)
+    await bump_stats({"admins": 1})
+    set_admins_exist(True)
     await db.otp_codes.delete_many({"email": data.email})
     
     token = create_token({"admin_id": admin_doc["id"], "email": data.email, "role": "admin"})
     return {"token": token, "admin": {"id": admin_doc["id"], "name": data.name, "email": data.email, "access_level": admin_doc["access_level"]}}
 
 @api_router.post("/admin/login")
-async def admin_login(data: AdminLogin):
+async def admin_login(data: AdminLogin, request: Request):
+    await enforce_rate_limit(request, "login")
+    await check_login_failures(data.email)
     admin = await db.admins.find_one({"email": data.email}, {"_id": 0})
-    if not admin or not verify_password(data.password, admin["password"]):
+    if not admin or not await verify_password(data.password, admin["password"]):
+        await record_login_failure(data.email)
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     # Check if admin is suspended
@@ -764,8 +1632,9 @@ async def admin_login(data: AdminLogin):
 # =========================
 
 @api_router.post("/auth/forgot-password")
-async def forgot_password(data: ForgotPasswordRequest):
+async def forgot_password(data: ForgotPasswordRequest, request: Request):
     """Request OTP for password reset - works for both admin and user"""
+    await enforce_rate_limit(request, "password_reset", data.email)
     if data.user_type == "admin":
         user = await db.admins.find_one({"email": data.email}, {"_id": 0})
         if not user:
@@ -778,14 +1647,7 @@ async def forgot_password(data: ForgotPasswordRequest):
     otp = generate_otp()
     expires = datetime.now(timezone.utc) + timedelta(minutes=10)
     
-    await db.otp_codes.delete_many({"email": data.email, "type": "password_reset"})
-    await db.otp_codes.insert_one({
-        "email": data.email, 
-        "otp": otp, 
-        "expires": expires.isoformat(),
-        "type": "password_reset",
-        "user_type": data.user_type
-    })
+    await store_otp(data.email, "password_reset", otp, expires, user_type=data.user_type)
     
     html = f"""
     <div style="font-family: 'Segoe UI', sans-serif; max-width: 600px; margin: 0 auto; background: linear-gradient(135deg, #0a1a1f 0%, #0d2229 100%); color: white; border-radius: 16px; overflow: hidden;">
@@ -821,7 +1683,7 @@ async def reset_password(data: ResetPasswordVerify):
     if datetime.fromisoformat(otp_doc["expires"]) < datetime.now(timezone.utc):
         raise HTTPException(status_code=400, detail="OTP expired")
     
-    new_password_hash = hash_password(data.new_password)
+    new_password_hash = await hash_password(data.new_password)
     
     if data.user_type == "admin":
         result = await db.admins.update_one(
@@ -837,18 +1699,19 @@ async def reset_password(data: ResetPasswordVerify):
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
     
+    await revoke_tokens("admin" if data.user_type == "admin" else "user", data.email)
     await db.otp_codes.delete_many({"email": data.email, "type": "password_reset"})
     logger.info(f"Password reset successful for {data.email}")
     return {"message": "Password reset successful"}
 
 @api_router.post("/admin/resend-otp")
-async def resend_admin_otp(data: AdminOTPRequest):
+async def resend_admin_otp(data: AdminOTPRequest, request: Request):
     """Resend OTP for admin registration"""
+    await enforce_rate_limit(request, "resend_otp", data.email)
     otp = generate_otp()
     expires = datetime.now(timezone.utc) + timedelta(minutes=10)
     
-    await db.otp_codes.delete_many({"email": data.email, "type": {"$ne": "password_reset"}})
-    await db.otp_codes.insert_one({"email": data.email, "otp": otp, "expires": expires.isoformat()})
+    await store_otp(data.email, "admin_registration", otp, expires)
     
     html = f"""
     <div style="font-family: 'Segoe UI', sans-serif; max-width: 600px; margin: 0 auto; background: linear-gradient(135deg, #0a1a1f 0%, #0d2229 100%); color: white; border-radius: 16px; overflow: hidden;">
@@ -887,6 +1750,7 @@ async def update_admin_access(admin_id: str, data: AdminAccessUpdate, super_admi
         raise HTTPException(status_code=400, detail="Invalid access level")
     
     await db.admins.update_one({"id": admin_id}, {"$set": {"access_level": data.access_level}})
+    invalidate_admin_auth(admin_id)
     return {"message": f"Access updated to {data.access_level}", "admin_id": admin_id}
 
 @api_router.delete("/admin/{admin_id}")
@@ -896,7 +1760,12 @@ async def delete_admin(admin_id: str, super_admin: dict = Depends(get_super_admi
         raise HTTPException(status_code=404, detail="Admin not found")
     if admin.get("email") == SUPER_ADMIN_EMAIL:
         raise HTTPException(status_code=400, detail="Cannot delete super admin")
-    await db.admins.delete_one({"id": admin_id})
+    result = await db.admins.delete_one({"id": admin_id})
+    if result.deleted_count:
+        await bump_stats({"admins": -1})
+    invalidate_admin_auth(admin_id)
+    set_admins_exist(None)
+    await revoke_tokens("admin", admin["email"])
     return {"message": "Admin deleted"}
 
 @api_router.put("/admin/{admin_id}/suspend")
@@ -915,6 +1784,9 @@ async def suspend_admin(admin_id: str, data: AdminSuspendUpdate, super_admin: di
         update_data["suspension_reason"] = None
     
     await db.admins.update_one({"id": admin_id}, {"$set": update_data})
+    invalidate_admin_auth(admin_id)
+    if data.suspended:
+        await revoke_tokens("admin", admin["email"])
     action = "suspended" if data.suspended else "unsuspended"
     return {"message": f"Admin {action} successfully", "admin_id": admin_id}
 
@@ -1095,6 +1967,7 @@ async def update_contact_info(data: ContactInfoUpdate, admin: dict = Depends(get
         raise HTTPException(status_code=400, detail="No update data")
     
     await db.contact_info.update_one({"id": "contact"}, {"$set": update_data}, upsert=True)
+    await reindex_chat_source("content")
     updated = await db.contact_info.find_one({"id": "contact"}, {"_id": 0})
     return updated
 
@@ -1115,6 +1988,7 @@ async def update_site_content(data: SiteContentUpdate, admin: dict = Depends(get
         raise HTTPException(status_code=400, detail="No update data")
     
     await db.site_content.update_one({"id": "content"}, {"$set": update_data}, upsert=True)
+    await reindex_chat_source("content")
     updated = await db.site_content.find_one({"id": "content"}, {"_id": 0})
     return updated
 
@@ -1171,33 +2045,71 @@ DEFAULT_SERVICES = [
     {"id": str(uuid.uuid4()), "name": "Music Production", "description": "Full-scale music production from composition to final master.", "price": None, "price_type": "project", "icon": "music", "image_url": "https://images.unsplash.com/photo-1493225255756-d9584f8606e9?auto=format&fit=crop&q=80", "requires_hours": False, "created_at": datetime.now(timezone.utc).isoformat()}
 ]
 
+CURRENCY_CODES = {"₹": "INR", "rs": "INR", "inr": "INR", "$": "USD", "usd": "USD", "€": "EUR", "eur": "EUR", "£": "GBP", "gbp": "GBP"}
+PRICE_UNITS = {"hr": "hour", "hour": "hour", "h": "hour", "min": "minute", "minute": "minute", "day": "day",
+               "session": "session", "song": "song", "track": "track", "project": "project"}
+PRICE_PATTERN = re.compile(
+    r"(?P<symbol>₹|\$|€|£|rs\.?|inr|usd|eur|gbp)?\s*(?P<amount>\d[\d,]*(?:\.\d+)?)\s*(?P<code>inr|usd|eur|gbp)?\s*(?:/|per\s+)?\s*(?P<unit>[a-z]+)?",
+    re.IGNORECASE
+)
+PRICE_FIELDS = ("price_amount", "price_currency", "price_unit")
+
+def parse_price(price: Optional[str]) -> dict:
+    """Structured fields from a display price: "₹299/hr" -> 299.0 INR per hour, "$1,200" -> 1200.0 USD per project.
+    All None when there is no number (e.g. "Contact for pricing")."""
+    matches = list(PRICE_PATTERN.finditer(price or ""))
+    # Prefer the number that carries a currency ("2 hours ₹600" is 600, not 2)
+    match = next((m for m in matches if m["symbol"] or m["code"]), matches[0] if matches else None)
+    if not match:
+        return dict.fromkeys(PRICE_FIELDS)
+    currency = (match["symbol"] or match["code"] or "").lower().rstrip(".")
+    unit = (match["unit"] or "").lower()
+    return {
+        "price_amount": float(match["amount"].replace(",", "")),
+        "price_currency": CURRENCY_CODES.get(currency, DEFAULT_PRICE_CURRENCY),
+        "price_unit": PRICE_UNITS.get(unit) or PRICE_UNITS.get(unit.rstrip("s")) or "project"
+    }
+
+def with_structured_price(data: dict) -> dict:
+    # Explicit structured fields win; otherwise they follow the display price
+    if "price" in data and all(data.get(field) is None for field in PRICE_FIELDS):
+        data.update(parse_price(data["price"]))
+    return data
+
 @api_router.get("/services")
 async def get_services():
     services = await db.services.find({}, {"_id": 0}).to_list(100)
     if not services:
-        for s in DEFAULT_SERVICES:
+        services = [with_structured_price(s.copy()) for s in DEFAULT_SERVICES]
+        for s in services:
             await db.services.insert_one(s.copy())
-        services = DEFAULT_SERVICES
+        await bump_stats({"services": len(DEFAULT_SERVICES)})
     return services
 
 @api_router.post("/services")
 async def create_service(service: ServiceCreate, admin: dict = Depends(get_admin_with_full_access)):
     service_doc = {
         "id": str(uuid.uuid4()),
-        **service.model_dump(),
+        **with_structured_price(service.model_dump()),
+        "image_meta": await image_meta_for(service.image_url),
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     await db.services.insert_one(service_doc)
+    await bump_stats({"services": 1})
+    await reindex_chat_source("service", service_doc["id"])
     return await db.services.find_one({"id": service_doc["id"]}, {"_id": 0})
 
 @api_router.put("/services/{service_id}")
 async def update_service(service_id: str, service: ServiceUpdate, admin: dict = Depends(get_admin_with_full_access)):
-    update_data = {k: v for k, v in service.model_dump().items() if v is not None}
+    update_data = with_structured_price({k: v for k, v in service.model_dump().items() if v is not None})
     if not update_data:
         raise HTTPException(status_code=400, detail="No update data")
+    if "image_url" in update_data:
+        update_data["image_meta"] = await image_meta_for(update_data["image_url"])
     result = await db.services.update_one({"id": service_id}, {"$set": update_data})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Service not found")
+    await reindex_chat_source("service", service_id)
     return await db.services.find_one({"id": service_id}, {"_id": 0})
 
 @api_router.delete("/services/{service_id}")
@@ -1205,6 +2117,8 @@ async def delete_service(service_id: str, admin: dict = Depends(get_admin_with_f
     result = await db.services.delete_one({"id": service_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Service not found")
+    await bump_stats({"services": -1})
+    await reindex_chat_source("service", service_id)
     return {"message": "Service deleted"}
 
 # =========================
@@ -1225,6 +2139,7 @@ async def get_projects():
     if not projects:
         for p in DEFAULT_PROJECTS:
             await db.projects.insert_one(p.copy())
+        await bump_stats({"projects": len(DEFAULT_PROJECTS)})
         projects = DEFAULT_PROJECTS
     return projects
 
@@ -1233,9 +2148,12 @@ async def create_project(project: ProjectCreate, admin: dict = Depends(get_admin
     project_doc = {
         "id": str(uuid.uuid4()),
         **project.model_dump(),
+        "image_meta": await image_meta_for(project.image_url),
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     await db.projects.insert_one(project_doc)
+    await bump_stats({"projects": 1})
+    await reindex_chat_source("project", project_doc["id"])
     return await db.projects.find_one({"id": project_doc["id"]}, {"_id": 0})
 
 @api_router.put("/projects/{project_id}")
@@ -1243,9 +2161,12 @@ async def update_project(project_id: str, project: ProjectUpdate, admin: dict =
     update_data = {k: v for k, v in project.model_dump().items() if v is not None}
     if not update_data:
         raise HTTPException(status_code=400, detail="No update data")
+    if "image_url" in update_data:
+        update_data["image_meta"] = await image_meta_for(update_data["image_url"])
     result = await db.projects.update_one({"id": project_id}, {"$set": update_data})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Project not found")
+    await reindex_chat_source("project", project_id)
     return await db.projects.find_one({"id": project_id}, {"_id": 0})
 
 @api_router.delete("/projects/{project_id}")
@@ -1253,21 +2174,36 @@ async def delete_project(project_id: str, admin: dict = Depends(get_admin_with_f
     result = await db.projects.delete_one({"id": project_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Project not found")
+    await bump_stats({"projects": -1})
+    await reindex_chat_source("project", project_id)
     return {"message": "Project deleted"}
 
 # =========================
 # BOOKINGS
 # =========================
 
+def price_snapshot(service: Optional[dict], hours: Optional[int]) -> dict:
+    """The service's structured price at booking time, plus the amount it implies for this booking"""
+    pricing = {field: (service or {}).get(field) for field in PRICE_FIELDS}
+    amount = pricing["price_amount"]
+    if amount is not None and pricing["price_unit"] == "hour":
+        amount = amount * hours if hours else None
+    return {**pricing, "expected_amount": amount}
+
 @api_router.post("/bookings")
-async def create_booking(booking: BookingCreate):
+async def create_booking(booking: BookingCreate, request: Request):
+    await enforce_rate_limit(request, "booking", booking.email)
+    service = await db.services.find_one({"id": booking.service_id}, {"_id": 0, **dict.fromkeys(PRICE_FIELDS, 1)})
     booking_doc = {
         "id": str(uuid.uuid4()),
         **booking.model_dump(),
+        **price_snapshot(service, booking.hours),
         "status": "pending",
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     await db.bookings.insert_one(booking_doc)
+    await bump_stats({"bookings.total": 1, status_counter("bookings", "pending"): 1})
+    await bump_booking_rollup(booking_doc, "pending", 1)
     inserted = await db.bookings.find_one({"id": booking_doc["id"]}, {"_id": 0})
     
     # Send emails
@@ -1299,9 +2235,15 @@ async def track_booking(booking_id: str, email: str):
 
 @api_router.put("/bookings/{booking_id}/status")
 async def update_booking_status(booking_id: str, status_update: BookingStatusUpdate, admin: dict = Depends(get_current_admin)):
-    result = await db.bookings.update_one({"id": booking_id}, {"$set": {"status": status_update.status}})
-    if result.matched_count == 0:
+    previous = await db.bookings.find_one_and_update(
+        {"id": booking_id}, {"$set": {"status": status_update.status}}, projection=ROLLUP_PROJECTION
+    )
+    if previous is None:
         raise HTTPException(status_code=404, detail="Booking not found")
+    await bump_status_change("bookings", previous.get("status"), status_update.status)
+    if previous.get("status") != status_update.status:
+        await bump_booking_rollup(previous, previous.get("status"), -1)
+        await bump_booking_rollup(previous, status_update.status, 1)
     
     updated = await db.bookings.find_one({"id": booking_id}, {"_id": 0})
     
@@ -1312,9 +2254,11 @@ async def update_booking_status(booking_id: str, status_update: BookingStatusUpd
 
 @api_router.delete("/bookings/{booking_id}")
 async def delete_booking(booking_id: str, admin: dict = Depends(get_current_admin)):
-    result = await db.bookings.delete_one({"id": booking_id})
-    if result.deleted_count == 0:
+    deleted = await db.bookings.find_one_and_delete({"id": booking_id}, projection=ROLLUP_PROJECTION)
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Booking not found")
+    await bump_stats({"bookings.total": -1, status_counter("bookings", deleted.get("status")): -1})
+    await bump_booking_rollup(deleted, deleted.get("status"), -1)
     return {"message": "Booking deleted"}
 
 # =========================
@@ -1333,10 +2277,12 @@ async def submit_application(data: JobApplicationCreate):
         "position_type": data.position_type,
         "note": data.note,
         "portfolio_url": data.portfolio_url,
+        "cv_filename": data.cv_filename,
         "status": "pending",  # pending, reviewed, contacted, rejected, hired
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     await db.applications.insert_one(application)
+    await bump_stats({"applications.total": 1, status_counter("applications", "pending"): 1})
     
     # Send notification to admin
     html = f"""
@@ -1386,15 +2332,15 @@ async def update_application_status(app_id: str, status: str, admin: dict = Depe
     if status not in ["pending", "reviewed", "contacted", "rejected", "hired"]:
         raise HTTPException(status_code=400, detail="Invalid status")
     
-    # Get the application first
-    application = await db.applications.find_one({"id": app_id}, {"_id": 0})
-    if not application:
-        raise HTTPException(status_code=404, detail="Application not found")
-    
-    result = await db.applications.update_one(
+    # Returns the application as it was before the update
+    application = await db.applications.find_one_and_update(
         {"id": app_id},
-        {"$set": {"status": status, "updated_at": datetime.now(timezone.utc).isoformat()}}
+        {"$set": {"status": status, "updated_at": datetime.now(timezone.utc).isoformat()}},
+        projection={"_id": 0}
     )
+    if not application:
+        raise HTTPException(status_code=404, detail="Application not found")
+    await bump_status_change("applications", application.get("status"), status)
     
     # Send acceptance email if status is "hired"
     if status == "hired":
@@ -1466,57 +2412,809 @@ async def update_application_status(app_id: str, status: str, admin: dict = Depe
 @api_router.delete("/applications/{app_id}")
 async def delete_application(app_id: str, admin: dict = Depends(get_super_admin)):
     """Delete an application (Super admin only)"""
-    result = await db.applications.delete_one({"id": app_id})
-    if result.deleted_count == 0:
+    deleted = await db.applications.find_one_and_delete({"id": app_id}, projection={"_id": 0, "status": 1})
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Application not found")
+    await bump_stats({"applications.total": -1, status_counter("applications", deleted.get("status")): -1})
     return {"message": "Application deleted"}
 
 # =========================
 # CHAT
 # =========================
 
-@api_router.post("/chat")
-async def chat_with_ai(data: ChatMessage):
-    try:
-        from emergentintegrations.llm.chat import LlmChat, UserMessage
-        
-        session_id = data.session_id or str(uuid.uuid4())
-        services = await db.services.find({}, {"_id": 0, "name": 1, "description": 1, "price": 1}).to_list(10)
-        services_ctx = "\n".join([f"- {s['name']}: {s['description']} (Price: {s.get('price', 'Contact for pricing')})" for s in services])
-        
-        system_msg = f"""You are a friendly AI assistant for Hogwarts Music Studio, a professional audio post-production studio.
+# "prompt version:index version:question" -> (expires, answer), least recently used first
+_answer_cache: OrderedDict = OrderedDict()
+answer_cache_stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+def normalize_question(message: str) -> Optional[str]:
+    """Lowercased words without punctuation, or None if the message is too long to be worth caching"""
+    words = re.sub(r"[^\w\s]", " ", message.lower()).split()
+    question = " ".join(words)
+    if not question or len(question) > CHAT_CACHE_MAX_QUESTION:
+        return None
+    return question
+
+def answer_cache_key(message: str, session: dict, version: str) -> Optional[str]:
+    # Follow-up turns depend on the conversation so far, only context-free first turns are cached
+    if session["turns"] or session["summary"]:
+        return None
+    question = normalize_question(message)
+    return f"{version}:{_chat_index_state['version']}:{question}" if question else None
 
-Services:
-{services_ctx}
+def get_cached_answer(key: Optional[str]) -> Optional[str]:
+    if key is None:
+        return None
+    cached = _answer_cache.get(key)
+    if cached:
+        expires, answer = cached
+        if expires > time.monotonic():
+            _answer_cache.move_to_end(key)
+            answer_cache_stats["hits"] += 1
+            return answer
+        del _answer_cache[key]
+        answer_cache_stats["expirations"] += 1
+    answer_cache_stats["misses"] += 1
+    return None
+
+def cache_answer(key: Optional[str], answer: str):
+    if key is None or not answer:
+        return
+    _answer_cache[key] = (time.monotonic() + CHAT_CACHE_TTL, answer)
+    _answer_cache.move_to_end(key)
+    while len(_answer_cache) > CHAT_CACHE_SIZE:
+        _answer_cache.popitem(last=False)
+        answer_cache_stats["evictions"] += 1
+
+# version is a digest of the prompt, so a worker that rebuilds it after an edit made elsewhere
+# stops matching answers cached from the old one; generation is bumped on every local invalidation
+_chat_context = {"generation": 0, "version": "", "prompt": None, "built_at": 0.0}
+
+def content_version(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+def invalidate_chat_context():
+    _chat_context["generation"] += 1
+    _chat_context["prompt"] = None
+    _answer_cache.clear()
+
+async def build_chat_system_prompt() -> str:
+    services, contact, content = await asyncio.gather(
+        db.services.find({}, {"_id": 0, "name": 1}).to_list(100),
+        db.contact_info.find_one({"id": "contact"}, {"_id": 0}),
+        db.site_content.find_one({"id": "content"}, {"_id": 0})
+    )
+    contact = contact or DEFAULT_CONTACT_INFO
+    content = content or DEFAULT_SITE_CONTENT
+    services_ctx = ", ".join(s["name"] for s in services)
+    phones = " / ".join(p for p in [contact.get("phone"), contact.get("phone2")] if p) or ADMIN_PHONE
+    founder = ", ".join(p for p in [content.get("founder_name"), content.get("founder_title")] if p)
+    
+    # Service details, projects and about/careers text are retrieved per question (see chat_index)
+    return f"""You are a friendly AI assistant for Hogwarts Music Studio, a professional audio post-production studio.
+
+Services offered: {services_ctx}
+Founder: {founder}
 
-Contact: {ADMIN_EMAIL} | {ADMIN_PHONE}
+Contact: {contact.get("email") or ADMIN_EMAIL} | {phones}
+Address: {contact.get("address", "")}
+Location: {contact.get("location_url", "")}
 Booking: Users can book directly through the website.
 
 Be helpful, professional, and guide users to book services. Keep responses concise."""
 
-        chat = LlmChat(api_key=EMERGENT_LLM_KEY, session_id=session_id, system_message=system_msg).with_model("openai", "gpt-5.2")
-        response = await chat.send_message(UserMessage(text=data.message))
+chat_index = BM25Index()
+# Service names alone, for price questions (see direct_answer)
+service_name_index = BM25Index()
+# version is a digest of the indexed snippets, which end up in prompts and direct answers
+_chat_index_state = {"built_at": 0.0, "version": ""}
+retrieval_stats = {"direct_answers": 0, "rebuilds": 0, "incremental_updates": 0}
+
+def service_chat_doc(service: dict) -> tuple:
+    price = service.get("price") or "Contact for pricing"
+    snippet = f"{service['name']}: {service['description']} Price: {price}."
+    return f"service:{service['id']}", snippet, snippet
+
+def service_name_doc(service: dict) -> tuple:
+    doc_id, _, snippet = service_chat_doc(service)
+    return doc_id, service["name"], snippet
+
+def project_chat_doc(project: dict) -> tuple:
+    snippet = f"Project {project['name']} ({project.get('work_type', '')}): {project['description']}"
+    return f"project:{project['id']}", f"{snippet} project portfolio work", snippet
+
+def content_chat_docs(content: Optional[dict], contact: Optional[dict]) -> List[tuple]:
+    content = content or DEFAULT_SITE_CONTENT
+    contact = contact or DEFAULT_CONTACT_INFO
+    phones = " or ".join(p for p in [contact.get("phone"), contact.get("phone2")] if p) or ADMIN_PHONE
+    contact_snippet = f"You can reach us at {contact.get('email') or ADMIN_EMAIL} or {phones}. Address: {contact.get('address', '')}. Directions: {contact.get('location_url', '')}"
+    about_snippet = " ".join(t for t in [
+        content.get("about_page_description") or content.get("about_description"),
+        content.get("about_philosophy_text"),
+        f"Founded by {content.get('founder_name')}, {content.get('founder_title')}." if content.get("founder_name") else None
+    ] if t)
+    careers_snippet = f"{content.get('careers_description', '')} You can apply on our Careers page."
+    return [
+        ("content:contact", f"{contact_snippet} contact email phone call number address location located where directions reach", contact_snippet),
+        ("content:about", f"{about_snippet} about studio founder who story philosophy", about_snippet),
+        ("content:careers", f"{careers_snippet} career job hiring vacancy work apply internship", careers_snippet)
+    ]
+
+async def rebuild_chat_index():
+    global chat_index, service_name_index
+    services, projects, content, contact = await asyncio.gather(
+        db.services.find({}, {"_id": 0}).to_list(100),
+        db.projects.find({}, {"_id": 0}).to_list(500),
+        db.site_content.find_one({"id": "content"}, {"_id": 0}),
+        db.contact_info.find_one({"id": "contact"}, {"_id": 0})
+    )
+    index = BM25Index()
+    for doc in [*map(service_chat_doc, services), *map(project_chat_doc, projects), *content_chat_docs(content, contact)]:
+        index.upsert(*doc)
+    names = BM25Index()
+    for doc in map(service_name_doc, services):
+        names.upsert(*doc)
+    chat_index, service_name_index = index, names
+    _chat_index_state.update(built_at=time.monotonic(), version=index_version(index))
+    retrieval_stats["rebuilds"] += 1
+
+def index_version(index: BM25Index) -> str:
+    return content_version("\n".join(f"{doc_id}\t{snippet}" for doc_id, snippet in sorted(zip(index.ids, index.snippets))))
+
+async def ensure_chat_index():
+    # Edits in this worker update the index in place; the periodic rebuild picks up edits made in other workers
+    if not _chat_index_state["built_at"] or time.monotonic() - _chat_index_state["built_at"] > CHAT_CONTEXT_TTL:
+        await rebuild_chat_index()
+
+async def reindex_chat_source(kind: str, item_id: Optional[str] = None):
+    """Refresh the index entries for one service or project (dropped if deleted), or for the
+    site content and contact docs, then invalidate the cached prompt and answers"""
+    if _chat_index_state["built_at"]:
+        if kind == "content":
+            content, contact = await asyncio.gather(
+                db.site_content.find_one({"id": "content"}, {"_id": 0}),
+                db.contact_info.find_one({"id": "contact"}, {"_id": 0})
+            )
+            for doc in content_chat_docs(content, contact):
+                chat_index.upsert(*doc)
+        else:
+            collection, to_doc = (db.services, service_chat_doc) if kind == "service" else (db.projects, project_chat_doc)
+            item = await collection.find_one({"id": item_id}, {"_id": 0})
+            if item:
+                chat_index.upsert(*to_doc(item))
+            else:
+                chat_index.remove(f"{kind}:{item_id}")
+            if kind == "service":
+                if item:
+                    service_name_index.upsert(*service_name_doc(item))
+                else:
+                    service_name_index.remove(f"service:{item_id}")
+        _chat_index_state["version"] = index_version(chat_index)
+        retrieval_stats["incremental_updates"] += 1
+    invalidate_chat_context()
+
+def retrieval_context(message: str) -> str:
+    hits = chat_index.search(message, CHAT_RETRIEVAL_TOP_K)
+    return "\n".join(f"- {snippet}" for _, _, snippet in hits)
+
+# Words that ask for a price rather than name what is being priced (after tokenize)
+PRICE_QUESTION_TERMS = frozenset("price pricing cost rate fee charge much expensive cheap".split())
+
+def direct_answer(message: str, session: dict) -> Optional[str]:
+    """A stored snippet that answers a context-free question with high confidence.
+    Price questions are matched on their remaining words against service names alone: every
+    service snippet carries a price, so the price words don't tell services apart."""
+    if session["turns"] or session["summary"]:
+        return None
+    terms = tokenize(message)
+    if any(t in PRICE_QUESTION_TERMS for t in terms):
+        best = service_name_index.best_answer(" ".join(t for t in terms if t not in PRICE_QUESTION_TERMS))
+    else:
+        best = chat_index.best_answer(message)
+    if not best or best[1] < CHAT_DIRECT_ANSWER_CONFIDENCE:
+        return None
+    retrieval_stats["direct_answers"] += 1
+    doc_id, _, snippet = best
+    if doc_id.startswith("service:"):
+        return f"{snippet} You can book it directly on our website."
+    return snippet
+
+async def get_chat_system_prompt():
+    """Cached system prompt and its version"""
+    if _chat_context["prompt"] is None or time.monotonic() - _chat_context["built_at"] > CHAT_CONTEXT_TTL:
+        generation = _chat_context["generation"]
+        prompt = await build_chat_system_prompt()
+        # Don't cache a prompt that was invalidated while it was being built
+        if generation != _chat_context["generation"]:
+            return prompt, content_version(prompt)
+        _chat_context.update(prompt=prompt, version=content_version(prompt), built_at=time.monotonic())
+    return _chat_context["prompt"], _chat_context["version"]
+
+async def load_chat_session(session_id: str) -> dict:
+    session = await db.chat_sessions.find_one({"_id": session_id}, {"turns": 1, "summary": 1})
+    return {"turns": (session or {}).get("turns", []), "summary": (session or {}).get("summary", "")}
+
+def compose_chat_prompt(system_msg: str, session: dict, context: str = "") -> str:
+    """System prompt plus retrieved snippets, the session summary and recent turns (providers get no other history)"""
+    parts = [system_msg]
+    if context:
+        parts.append(f"Relevant studio information:\n{context}")
+    if session["summary"]:
+        parts.append(f"Summary of the earlier conversation:\n{session['summary']}")
+    if session["turns"]:
+        lines = [f"{'User' if turn['role'] == 'user' else 'Assistant'}: {turn['content']}" for turn in session["turns"]]
+        parts.append("Recent conversation:\n" + "\n".join(lines))
+    return "\n\n".join(parts)
+
+def summarize_turns(summary: str, dropped: List[dict]) -> str:
+    """Fold turns leaving the window into the summary without another LLM call: keep what the user asked,
+    dropping the oldest lines once the summary exceeds CHAT_SUMMARY_MAX_CHARS"""
+    lines = summary.split("\n") if summary else []
+    lines += [f"- User asked: {turn['content'][:200]}" for turn in dropped if turn["role"] == "user"]
+    while len(lines) > 1 and sum(len(line) + 1 for line in lines) > CHAT_SUMMARY_MAX_CHARS:
+        lines.pop(0)
+    return "\n".join(lines)
+
+async def record_chat_turn(session_id: str, message: str, reply: str):
+    """Append a question and reply atomically, so concurrent messages in a session both land"""
+    new_turns = [
+        {"role": "user", "content": message[:CHAT_TURN_MAX_CHARS]},
+        {"role": "assistant", "content": reply[:CHAT_TURN_MAX_CHARS]}
+    ]
+    now = datetime.now(timezone.utc)
+    before = await db.chat_sessions.find_one_and_update(
+        {"_id": session_id},
+        {
+            "$push": {"turns": {"$each": new_turns, "$slice": -CHAT_SESSION_TURNS}},
+            "$set": {"updated_at": now},
+            "$setOnInsert": {"created_at": now, "summary": ""}
+        },
+        projection={"turns": 1},
+        upsert=True,
+        return_document=ReturnDocument.BEFORE
+    )
+    # Updates to one document are serialized, so the state before this push tells exactly which turns it evicted
+    turns = (before or {}).get("turns", []) + new_turns
+    if len(turns) > CHAT_SESSION_TURNS:
+        await fold_into_summary(session_id, turns[:-CHAT_SESSION_TURNS])
+
+async def fold_into_summary(session_id: str, dropped: List[dict], attempts: int = 5):
+    """Compare-and-set the summary so concurrent folds don't overwrite each other"""
+    for _ in range(attempts):
+        session = await db.chat_sessions.find_one({"_id": session_id}, {"summary": 1})
+        if session is None:
+            return
+        summary = session.get("summary", "")
+        result = await db.chat_sessions.update_one(
+            {"_id": session_id, "summary": summary}, {"$set": {"summary": summarize_turns(summary, dropped)}}
+        )
+        if result.matched_count:
+            return
+    logger.warning(f"Chat summary for {session_id} changed {attempts} times in a row, dropped turns not folded")
+
+def chat_fallback_response() -> str:
+    return f"I apologize, but I'm having trouble. Please contact us at {ADMIN_EMAIL}"
+
+@api_router.post("/chat")
+async def chat_with_ai(data: ChatMessage, request: Request):
+    await enforce_rate_limit(request, "chat")
+    try:
+        session_id = data.session_id or str(uuid.uuid4())
+        (system_msg, version), session, _ = await asyncio.gather(get_chat_system_prompt(), load_chat_session(session_id), ensure_chat_index())
+        cache_key = answer_cache_key(data.message, session, version)
+        response = get_cached_answer(cache_key) or direct_answer(data.message, session)
+        if response is None:
+            prompt = compose_chat_prompt(system_msg, session, retrieval_context(data.message))
+            response = await chat_gateway.complete(prompt, session_id, data.message)
+            cache_answer(cache_key, response)
+        await record_chat_turn(session_id, data.message, response)
         return {"response": response, "session_id": session_id}
     except Exception as e:
         logger.error(f"Chat error: {str(e)}")
-        return {"response": f"I apologize, but I'm having trouble. Please contact us at {ADMIN_EMAIL}", "session_id": data.session_id}
+        return {"response": chat_fallback_response(), "session_id": data.session_id}
+
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+@api_router.post("/chat/stream")
+async def chat_stream(data: ChatMessage, request: Request):
+    """Same as /chat, but relays the reply as Server-Sent Events: a "session" event,
+    one "data: {delta}" message per chunk, then "done" (or "error" carrying the fallback text)"""
+    await enforce_rate_limit(request, "chat")
+    session_id = data.session_id or str(uuid.uuid4())
+    
+    async def events():
+        yield sse_event({"session_id": session_id}, "session")
+        chunks = None
+        try:
+            (system_msg, version), session, _ = await asyncio.gather(get_chat_system_prompt(), load_chat_session(session_id), ensure_chat_index())
+            cache_key = answer_cache_key(data.message, session, version)
+            cached = get_cached_answer(cache_key) or direct_answer(data.message, session)
+            if cached is not None:
+                yield sse_event({"delta": cached})
+                yield sse_event({}, "done")
+                await record_chat_turn(session_id, data.message, cached)
+                return
+            
+            reply = []
+            prompt = compose_chat_prompt(system_msg, session, retrieval_context(data.message))
+            chunks = chat_gateway.stream(prompt, session_id, data.message)
+            async for chunk in chunks:
+                if await request.is_disconnected():
+                    logger.info(f"Chat stream {session_id} cancelled by client")
+                    return
+                reply.append(chunk)
+                yield sse_event({"delta": chunk})
+            cache_answer(cache_key, "".join(reply))
+            yield sse_event({}, "done")
+            await record_chat_turn(session_id, data.message, "".join(reply))
+        except Exception as e:
+            logger.error(f"Chat stream error: {str(e)}")
+            yield sse_event({"delta": chat_fallback_response()}, "error")
+        finally:
+            # Stops the provider call when the client goes away mid-reply
+            if chunks is not None:
+                await chunks.aclose()
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
 
 # =========================
 # STATS
 # =========================
 
+async def count_by_status(collection) -> dict:
+    """status -> count in one $group pass"""
+    groups = await collection.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]).to_list(None)
+    return {group["_id"] or "unknown": group["count"] for group in groups}
+
+# Single document in stats_counters:
+# {"_id": "global", "bookings": {"total", "status": {status: n}}, "applications": {...}, "services", "projects", "admins", "users"}
+STATS_COUNTERS_ID = "global"
+
+def status_counter(kind: str, status: Optional[str]) -> str:
+    # Statuses become field names, so keep them free of "." and "$"
+    return f"{kind}.status.{re.sub(r'[.$]', '_', status or 'unknown')}"
+
+async def bump_stats(changes: dict):
+    try:
+        await db.stats_counters.update_one(
+            {"_id": STATS_COUNTERS_ID},
+            {"$inc": changes, "$set": {"updated_at": datetime.now(timezone.utc)}},
+            upsert=True
+        )
+    except Exception as e:
+        # Drift is repaired by reconcile_stats_counters, so never fail the write that triggered this
+        logger.error(f"Stats counter update error: {str(e)}")
+
+async def bump_status_change(kind: str, old_status: Optional[str], new_status: str):
+    if old_status != new_status:
+        await bump_stats({status_counter(kind, old_status): -1, status_counter(kind, new_status): 1})
+
+async def reconcile_stats_counters() -> dict:
+    """Recompute every counter from the collections and overwrite the counters document"""
+    bookings, applications, services, projects, admins, users = await asyncio.gather(
+        count_by_status(db.bookings),
+        count_by_status(db.applications),
+        db.services.count_documents({}),
+        db.projects.count_documents({}),
+        db.admins.count_documents({}),
+        db.users.count_documents({})
+    )
+    counters = {
+        "bookings": {"total": sum(bookings.values()), "status": {re.sub(r"[.$]", "_", k): v for k, v in bookings.items()}},
+        "applications": {"total": sum(applications.values()), "status": {re.sub(r"[.$]", "_", k): v for k, v in applications.items()}},
+        "services": services,
+        "projects": projects,
+        "admins": admins,
+        "users": users,
+        "updated_at": datetime.now(timezone.utc),
+        "reconciled_at": datetime.now(timezone.utc)
+    }
+    await db.stats_counters.replace_one({"_id": STATS_COUNTERS_ID}, counters, upsert=True)
+    return counters
+
+async def stats_reconcile_loop():
+    while True:
+        await asyncio.sleep(STATS_RECONCILE_INTERVAL_HOURS * 3600)
+        try:
+            await reconcile_stats_counters()
+        except Exception as e:
+            logger.error(f"Stats reconcile error: {str(e)}")
+
+async def load_admin_stats() -> dict:
+    counters = await db.stats_counters.find_one({"_id": STATS_COUNTERS_ID})
+    if not counters or "reconciled_at" not in counters:
+        counters = await reconcile_stats_counters()
+    bookings = counters.get("bookings", {})
+    applications = counters.get("applications", {})
+    booking_statuses = {k: v for k, v in bookings.get("status", {}).items() if v}
+    application_statuses = {k: v for k, v in applications.get("status", {}).items() if v}
+    return {
+        "total_bookings": bookings.get("total", 0),
+        "pending_bookings": booking_statuses.get("pending", 0),
+        "confirmed_bookings": booking_statuses.get("confirmed", 0),
+        "completed_bookings": booking_statuses.get("completed", 0),
+        "bookings_by_status": booking_statuses,
+        "total_services": counters.get("services", 0),
+        "total_projects": counters.get("projects", 0),
+        "total_admins": counters.get("admins", 0),
+        "total_applications": applications.get("total", 0),
+        "pending_applications": application_statuses.get("pending", 0),
+        "applications_by_status": application_statuses,
+        "total_users": counters.get("users", 0)
+    }
+
 @api_router.get("/admin/stats")
 async def get_admin_stats(admin: dict = Depends(get_current_admin)):
+    return await load_admin_stats()
+
+async def first_page(collection, page_size: int, sort_field: Optional[str] = None, projection: Optional[dict] = None) -> dict:
+    cursor = collection.find({}, {"_id": 0, **(projection or {})})
+    if sort_field:
+        cursor = cursor.sort(sort_field, -1)
+    items = await cursor.limit(page_size + 1).to_list(page_size + 1)
+    return {"items": items[:page_size], "has_more": len(items) > page_size}
+
+# Section -> minimum access level; a snapshot only loads the sections the caller asks for
+DASHBOARD_SECTIONS = {
+    "stats": "basic",
+    "bookings": "basic",
+    "services": "full",
+    "projects": "full",
+    "applications": "super",
+    "admins": "super",
+    "site_settings": "super",
+    "site_content": "super",
+    "contact_info": "super"
+}
+ACCESS_RANK = {"basic": 0, "full": 1, "super": 2}
+
+@api_router.get("/admin/dashboard")
+async def get_dashboard_snapshot(page_size: int = 20, include: Optional[str] = None, admin: dict = Depends(get_current_admin)):
+    """The dashboard sections named in include (comma-separated, default all), limited to what
+    this admin may see, fetched concurrently behind a single auth check"""
+    page_size = max(1, min(page_size, 100))
+    requested = [name.strip() for name in include.split(",") if name.strip()] if include else list(DASHBOARD_SECTIONS)
+    unknown = [name for name in requested if name not in DASHBOARD_SECTIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown dashboard sections: {', '.join(unknown)}")
+    if admin.get("email") == SUPER_ADMIN_EMAIL:
+        access_level = "super"
+    else:
+        state = await get_admin_auth_state(admin.get("admin_id"))
+        # Suspended admins keep basic access, matching the endpoints that only require get_current_admin
+        access_level = "basic" if not state or state["suspended"] else state["access_level"]
+    
+    loaders = {
+        "stats": lambda: load_admin_stats(),
+        "bookings": lambda: first_page(db.bookings, page_size, "created_at"),
+        "services": lambda: first_page(db.services, page_size),
+        "projects": lambda: first_page(db.projects, page_size),
+        "applications": lambda: first_page(db.applications, page_size, "created_at"),
+        "admins": lambda: first_page(db.admins, page_size, projection={"password": 0}),
+        "site_settings": lambda: db.site_settings.find_one({"id": "main"}, {"_id": 0}),
+        "site_content": lambda: db.site_content.find_one({"id": "content"}, {"_id": 0}),
+        "contact_info": lambda: db.contact_info.find_one({"id": "contact"}, {"_id": 0})
+    }
+    allowed = [name for name in dict.fromkeys(requested) if ACCESS_RANK[DASHBOARD_SECTIONS[name]] <= ACCESS_RANK[access_level]]
+    results = dict(zip(allowed, await asyncio.gather(*(loaders[name]() for name in allowed))))
+    defaults = {"site_settings": DEFAULT_SETTINGS, "site_content": DEFAULT_SITE_CONTENT, "contact_info": DEFAULT_CONTACT_INFO}
+    for name, default in defaults.items():
+        if name in results:
+            results[name] = results[name] or default
+    return {"access_level": access_level, "page_size": page_size, **results}
+
+@api_router.post("/admin/stats/reconcile")
+async def run_stats_reconcile(super_admin: dict = Depends(get_super_admin)):
+    """Recompute the dashboard counters from scratch (Super admin only)"""
+    counters = await reconcile_stats_counters()
+    return {"message": "Stats counters reconciled", "reconciled_at": counters["reconciled_at"].isoformat()}
+
+@api_router.get("/admin/cache-stats")
+async def get_cache_stats(super_admin: dict = Depends(get_super_admin)):
+    """In-process cache and chat gateway metrics (Super admin only)"""
+    answer_lookups = answer_cache_stats["hits"] + answer_cache_stats["misses"]
+    return {
+        "token_cache": {**token_cache_stats, "size": len(_token_cache), "max_size": TOKEN_CACHE_SIZE},
+        "admin_auth_cache": {"size": len(_admin_auth_cache), "ttl_seconds": ADMIN_AUTH_CACHE_TTL},
+        "chat_answer_cache": {
+            **answer_cache_stats,
+            "hit_rate": round(answer_cache_stats["hits"] / answer_lookups, 4) if answer_lookups else 0.0,
+            "size": len(_answer_cache),
+            "max_size": CHAT_CACHE_SIZE,
+            "prompt_version": _chat_context["version"],
+            "index_version": _chat_index_state["version"]
+        },
+        "chat_gateway": chat_gateway.snapshot(),
+        "chat_index": {**retrieval_stats, "documents": len(chat_index), "terms": len(chat_index.vocab)}
+    }
+
+# =========================
+# BOOKING ANALYTICS
+# =========================
+
+# booking_rollups has one document per (day booked, service, status):
+# {"_id": "2026-01-31|<service_id>|pending", "day", "service_id", "service_name", "status", "bookings", "hours"}
+ROLLUP_PROJECTION = {"_id": 0, "status": 1, "created_at": 1, "service_id": 1, "service_name": 1, "hours": 1}
+ANALYTICS_GROUPS = {"none": None, "service": "service_name", "status": "status"}
+
+def rollup_update(booking: dict, status: Optional[str], bookings: int, hours: int) -> tuple:
+    """(filter, update) adding bookings and hours to the rollup this booking falls in"""
+    day = (booking.get("created_at") or datetime.now(timezone.utc).isoformat())[:10]
+    service_id = booking.get("service_id") or "unknown"
+    status = status or "unknown"
+    return (
+        {"_id": f"{day}|{service_id}|{status}"},
+        {
+            "$inc": {"bookings": bookings, "hours": hours},
+            "$set": {"day": day, "service_id": service_id, "service_name": booking.get("service_name"), "status": status}
+        }
+    )
+
+async def acquire_job_lock(name: str, ttl_seconds: float) -> Optional[str]:
+    """Take the named lock in job_locks unless another worker holds an unexpired one. Returns the owner token."""
+    owner = uuid.uuid4().hex
+    now = datetime.now(timezone.utc)
+    try:
+        await db.job_locks.update_one(
+            {"_id": name, "expires_at": {"$lt": now}},
+            {"$set": {"owner": owner, "expires_at": now + timedelta(seconds=ttl_seconds)}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        return None
+    return owner
+
+async def release_job_lock(name: str, owner: str):
+    await db.job_locks.delete_one({"_id": name, "owner": owner})
+
+async def bump_booking_rollup(booking: dict, status: Optional[str], sign: int):
+    try:
+        rollup_filter, update = rollup_update(booking, status, sign, sign * (booking.get("hours") or 0))
+        await db.booking_rollups.update_one(rollup_filter, update, upsert=True)
+        # Lets a concurrent backfill find the days it has to recount
+        await db.booking_rollup_dirty.update_one(
+            {"_id": update["$set"]["day"]}, {"$set": {"touched_at": datetime.now(timezone.utc)}}, upsert=True
+        )
+    except Exception as e:
+        # A backfill rebuilds the rollups from the bookings themselves
+        logger.error(f"Booking rollup update error: {str(e)}")
+
+def group_rollups(bookings: List[dict]) -> list:
+    """[(sample booking, bookings, hours)] per rollup document, so each one gets a single update"""
+    grouped = {}
+    for booking in bookings:
+        key = ((booking.get("created_at") or "")[:10], booking.get("service_id"), booking.get("status"))
+        sample, count, hours = grouped.get(key, (booking, 0, 0))
+        grouped[key] = (sample, count + 1, hours + (booking.get("hours") or 0))
+    return list(grouped.values())
+
+async def recount_rollup_day(day: str):
+    """Overwrite one day's rollups with counts taken straight from the bookings"""
+    next_day = (datetime.strptime(day, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+    bookings = await db.bookings.find({"created_at": {"$gte": day, "$lt": next_day}}, ROLLUP_PROJECTION).to_list(None)
+    ids = []
+    for sample, count, hours in group_rollups(bookings):
+        rollup_filter, update = rollup_update(sample, sample.get("status"), count, hours)
+        await db.booking_rollups.update_one(rollup_filter, {"$set": {**update["$set"], "bookings": count, "hours": hours}}, upsert=True)
+        ids.append(rollup_filter["_id"])
+    await db.booking_rollups.delete_many({"day": day, "_id": {"$nin": ids}})
+
+async def backfill_booking_rollups(batch_size: int = ROLLUP_BACKFILL_BATCH_SIZE) -> Optional[dict]:
+    """Rebuild booking_rollups from scratch, reading bookings in _id order one batch at a time.
+    The rebuild goes into a staging collection that replaces the live one at the end, so the
+    dashboard keeps reading the old rollups meanwhile. Days whose bookings changed during the
+    run are recounted afterwards. Returns None if another worker is already running a backfill."""
+    owner = await acquire_job_lock("booking_rollups_backfill", ROLLUP_BACKFILL_LOCK_SECONDS)
+    if owner is None:
+        return None
+    started = datetime.now(timezone.utc)
+    staging = db[f"booking_rollups_rebuild_{owner}"]
+    scanned = 0
+    try:
+        last_id = None
+        while True:
+            query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+            batch = await db.bookings.find(query, {**ROLLUP_PROJECTION, "_id": 1}).sort("_id", 1).limit(batch_size).to_list(batch_size)
+            if not batch:
+                break
+            last_id = batch[-1]["_id"]
+            scanned += len(batch)
+            await staging.bulk_write([
+                UpdateOne(*rollup_update(sample, sample.get("status"), count, hours), upsert=True)
+                for sample, count, hours in group_rollups(batch)
+            ], ordered=False)
+        
+        if scanned:
+            await staging.rename("booking_rollups", dropTarget=True)
+            await db.booking_rollups.create_index("day")
+        else:
+            await db.booking_rollups.delete_many({})
+        
+        # Changes made while the batches were read went to the collection that was just replaced
+        dirty_days = await db.booking_rollup_dirty.distinct("_id", {"touched_at": {"$gte": started}})
+        for day in dirty_days:
+            await recount_rollup_day(day)
+    finally:
+        await staging.drop()
+        await release_job_lock("booking_rollups_backfill", owner)
+    return {
+        "bookings_scanned": scanned,
+        "days_recounted": len(dirty_days),
+        "rollup_documents": await db.booking_rollups.count_documents({})
+    }
+
+async def backfill_rollups_if_empty():
+    try:
+        if not await db.booking_rollups.find_one({}) and await db.bookings.find_one({}):
+            result = await backfill_booking_rollups()
+            if result:
+                logger.info(f"Booking rollups backfilled: {result}")
+    except Exception as e:
+        logger.error(f"Booking rollup backfill error: {str(e)}")
+
+def parse_day(value: str, field: str) -> datetime:
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{field} must be a YYYY-MM-DD date")
+
+@api_router.get("/admin/analytics/bookings")
+async def get_booking_analytics(start: str, end: str, group_by: str = "none", admin: dict = Depends(get_current_admin)):
+    """Daily booking counts and booked hours for [start, end], optionally split by service or status"""
+    if group_by not in ANALYTICS_GROUPS:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of {', '.join(ANALYTICS_GROUPS)}")
+    start_day, end_day = parse_day(start, "start"), parse_day(end, "end")
+    days = (end_day - start_day).days + 1
+    if days < 1 or days > ANALYTICS_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range must cover 1 to {ANALYTICS_MAX_DAYS} days")
+    
+    field = ANALYTICS_GROUPS[group_by]
+    group_key = {"day": "$day", "key": f"${field}"} if field else {"day": "$day"}
+    rows = await db.booking_rollups.aggregate([
+        {"$match": {"day": {"$gte": start, "$lte": end}}},
+        {"$group": {"_id": group_key, "bookings": {"$sum": "$bookings"}, "hours": {"$sum": "$hours"}}}
+    ]).to_list(None)
+    
+    # Dense series: one point per day for every key that has any bookings in the range
+    day_list = [(start_day + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days)]
+    series = {}
+    for row in rows:
+        if not row["bookings"] and not row["hours"]:
+            continue
+        key = row["_id"].get("key", "all") if field else "all"
+        points = series.setdefault(key or "unknown", {})
+        points[row["_id"]["day"]] = {"bookings": row["bookings"], "hours": row["hours"]}
+    
+    return {
+        "start": start,
+        "end": end,
+        "group_by": group_by,
+        "series": [
+            {
+                "key": key,
+                "total_bookings": sum(p["bookings"] for p in points.values()),
+                "total_hours": sum(p["hours"] for p in points.values()),
+                "points": [{"day": day, **points.get(day, {"bookings": 0, "hours": 0})} for day in day_list]
+            }
+            for key, points in sorted(series.items())
+        ]
+    }
+
+async def migrate_structured_prices(batch_size: int = ROLLUP_BACKFILL_BATCH_SIZE) -> dict:
+    """Parse the display price of services that predate structured pricing, then snapshot prices onto
+    bookings that have none. Old bookings get the service's current price, which is the best available."""
+    services_updated = 0
+    async for service in db.services.find({"price_amount": {"$exists": False}}, {"_id": 0, "id": 1, "price": 1}):
+        await db.services.update_one({"id": service["id"]}, {"$set": parse_price(service.get("price"))})
+        services_updated += 1
+    
+    services = {s["id"]: s for s in await db.services.find({}, {"_id": 0, "id": 1, **dict.fromkeys(PRICE_FIELDS, 1)}).to_list(None)}
+    bookings_updated = 0
+    while True:
+        batch = await db.bookings.find(
+            {"expected_amount": {"$exists": False}}, {"_id": 1, "service_id": 1, "hours": 1}
+        ).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        await db.bookings.bulk_write([
+            UpdateOne({"_id": b["_id"]}, {"$set": price_snapshot(services.get(b.get("service_id")), b.get("hours"))})
+            for b in batch
+        ], ordered=False)
+        bookings_updated += len(batch)
+    return {"services_updated": services_updated, "bookings_updated": bookings_updated}
+
+async def migrate_prices_on_startup():
+    try:
+        result = await migrate_structured_prices()
+        if result["services_updated"] or result["bookings_updated"]:
+            logger.info(f"Structured price migration: {result}")
+    except Exception as e:
+        logger.error(f"Structured price migration error: {str(e)}")
+
+REVENUE_PERIODS = {"day": 10, "month": 7, "year": 4}
+
+@api_router.get("/admin/analytics/revenue")
+async def get_revenue_report(start: str, end: str, period: str = "month", statuses: str = "confirmed,completed",
+                             admin: dict = Depends(get_current_admin)):
+    """Expected revenue per period and currency for bookings created in [start, end] with the given statuses"""
+    if period not in REVENUE_PERIODS:
+        raise HTTPException(status_code=400, detail=f"period must be one of {', '.join(REVENUE_PERIODS)}")
+    end_next = (parse_day(end, "end") + timedelta(days=1)).strftime("%Y-%m-%d")
+    parse_day(start, "start")
+    status_list = [s.strip() for s in statuses.split(",") if s.strip()]
+    
+    rows = await db.bookings.aggregate([
+        {"$match": {"created_at": {"$gte": start, "$lt": end_next}, "status": {"$in": status_list}}},
+        {"$group": {
+            "_id": {"period": {"$substrCP": ["$created_at", 0, REVENUE_PERIODS[period]]}, "currency": "$price_currency"},
+            "revenue": {"$sum": "$expected_amount"},
+            "bookings": {"$sum": 1},
+            "unpriced_bookings": {"$sum": {"$cond": [{"$eq": [{"$ifNull": ["$expected_amount", None]}, None]}, 1, 0]}}
+        }},
+        {"$sort": {"_id.period": 1, "_id.currency": 1}}
+    ]).to_list(None)
+    
     return {
-        "total_bookings": await db.bookings.count_documents({}),
-        "pending_bookings": await db.bookings.count_documents({"status": "pending"}),
-        "confirmed_bookings": await db.bookings.count_documents({"status": "confirmed"}),
-        "completed_bookings": await db.bookings.count_documents({"status": "completed"}),
-        "total_services": await db.services.count_documents({}),
-        "total_projects": await db.projects.count_documents({}),
-        "total_admins": await db.admins.count_documents({})
+        "start": start,
+        "end": end,
+        "period": period,
+        "statuses": status_list,
+        "rows": [
+            {"period": row["_id"]["period"], "currency": row["_id"].get("currency"), "revenue": row["revenue"],
+             "bookings": row["bookings"], "unpriced_bookings": row["unpriced_bookings"]}
+            for row in rows
+        ]
     }
 
+@api_router.post("/admin/analytics/backfill")
+async def run_rollup_backfill(super_admin: dict = Depends(get_super_admin)):
+    """Rebuild the daily booking rollups from the bookings collection (Super admin only)"""
+    result = await backfill_booking_rollups()
+    if result is None:
+        raise HTTPException(status_code=409, detail="A rollup backfill is already running")
+    return result
+
+# =========================
+# METRICS
+# =========================
+
+metrics_registry = MetricsRegistry()
+
+async def get_metrics_reader(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    if not credentials:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    if METRICS_TOKEN and hmac.compare_digest(credentials.credentials, METRICS_TOKEN):
+        return {"role": "metrics"}
+    payload = decode_token(credentials.credentials)
+    if payload.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return payload
+
+def app_metric_samples():
+    """Cache, chat and executor state as (name, help, type, labels, value) samples"""
+    for event, count in token_cache_stats.items():
+        yield ("app_token_cache_events_total", "JWT cache lookups and removals", "counter", {"event": event}, count)
+    for event in ["hits", "misses", "evictions", "expirations"]:
+        yield ("app_chat_answer_cache_events_total", "Chat answer cache lookups and removals", "counter", {"event": event}, answer_cache_stats[event])
+    yield ("app_cache_entries", "Entries held by in-process caches", "gauge", {"cache": "token"}, len(_token_cache))
+    yield ("app_cache_entries", "Entries held by in-process caches", "gauge", {"cache": "admin_auth"}, len(_admin_auth_cache))
+    yield ("app_cache_entries", "Entries held by in-process caches", "gauge", {"cache": "chat_answer"}, len(_answer_cache))
+    gateway = chat_gateway.snapshot()
+    yield ("app_chat_in_flight", "LLM calls in progress", "gauge", {}, gateway["in_flight"])
+    yield ("app_chat_queued", "Chat requests waiting for an LLM slot", "gauge", {}, gateway["queued"])
+    for event in ["calls", "rejected", "queue_timeouts", "timeouts", "errors"]:
+        yield ("app_chat_gateway_events_total", "Chat gateway outcomes", "counter", {"event": event}, gateway[event])
+    yield ("app_chat_direct_answers_total", "Chat questions answered from the retrieval index", "counter", {}, retrieval_stats["direct_answers"])
+
+@api_router.get("/metrics")
+async def get_metrics(reader: dict = Depends(get_metrics_reader)):
+    """Prometheus text exposition for this worker process"""
+    return Response(metrics_registry.render(app_metric_samples()), media_type="text/plain; version=0.0.4")
+
 @api_router.get("/")
 async def root():
     return {"message": "Hogwarts Music Studio API"}
@@ -1531,6 +3229,56 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Added last so it is the outermost middleware and times everything, CORS included
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware, registry=metrics_registry)
+
+# Long-running jobs started at startup, referenced here so they aren't garbage collected
+_periodic_tasks: list = []
+
+INDEX_OPTIONS_CONFLICT = 85
+
+async def ensure_index(collection, key, **options):
+    """create_index that logs failures instead of raising, so one bad index doesn't skip the rest.
+    A changed TTL on an existing single-field index is applied in place with collMod."""
+    try:
+        await collection.create_index(key, **options)
+    except OperationFailure as e:
+        if e.code == INDEX_OPTIONS_CONFLICT and "expireAfterSeconds" in options:
+            try:
+                await db.command("collMod", collection.name, index={"keyPattern": {key: 1}, "expireAfterSeconds": options["expireAfterSeconds"]})
+                return
+            except Exception as mod_error:
+                e = mod_error
+        logger.error(f"Index creation error on {collection.name}: {str(e)}")
+    except Exception as e:
+        logger.error(f"Index creation error on {collection.name}: {str(e)}")
+
+@app.on_event("startup")
+async def startup_tasks():
+    await ensure_index(db.otp_codes, "expires_at", expireAfterSeconds=0)
+    # Unique so concurrent store_otp upserts can't leave two pending codes for one email and purpose
+    await ensure_index(db.otp_codes, [("email", 1), ("type", 1)], unique=True)
+    await ensure_index(db.rate_limits, "expires_at", expireAfterSeconds=0)
+    await ensure_index(db.token_revocations, "expires_at", expireAfterSeconds=0)
+    await ensure_index(db.uploads, "filename")
+    await ensure_index(db.uploads, "last_uploaded_at")
+    await ensure_index(db.chat_sessions, "updated_at", expireAfterSeconds=int(CHAT_SESSION_TTL_HOURS * 3600))
+    await ensure_index(db.booking_rollups, "day")
+    await ensure_index(db.booking_rollup_dirty, "touched_at", expireAfterSeconds=86400)
+    await ensure_index(db.bookings, [("status", 1), ("created_at", 1)])
+    _periodic_tasks.append(asyncio.create_task(token_revocation_sync_loop()))
+    if UPLOAD_GC_INTERVAL_HOURS > 0:
+        _periodic_tasks.append(asyncio.create_task(upload_gc_loop()))
+    _periodic_tasks.append(asyncio.create_task(backfill_rollups_if_empty()))
+    _periodic_tasks.append(asyncio.create_task(migrate_prices_on_startup()))
+    if STATS_RECONCILE_INTERVAL_HOURS > 0:
+        _periodic_tasks.append(asyncio.create_task(stats_reconcile_loop()))
+    if isinstance(storage, LocalStorage) and storage.sharded:
+        _periodic_tasks.append(asyncio.create_task(migrate_upload_layout()))
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     client.close()
+    password_executor.shutdown(wait=False)
+    image_executor.shutdown(wait=False)
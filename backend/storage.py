@@ -0,0 +1,227 @@
+"""Storage backends for uploaded media.
+
+Keys are flat names like "abc.jpg" or "variants/abc_w640.webp". All methods are
+blocking; server.py calls them through asyncio.to_thread.
+"""
+import hashlib
+import os
+import re
+import shutil
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+# (key, modified time as epoch seconds, size in bytes)
+StoredObject = Tuple[str, float, int]
+
+class StorageBackend(ABC):
+    """Interface shared by the local and S3 backends"""
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        pass
+
+    def local_path(self, key: str) -> Optional[Path]:
+        """Path to serve or process the object from directly, if the backend is on local disk"""
+        return None
+
+    @abstractmethod
+    def put_file(self, src: Path, key: str, content_type: Optional[str] = None):
+        """Move a finished local file into storage under key; src is consumed"""
+
+    @abstractmethod
+    def fetch_to(self, key: str, dest: Path):
+        """Copy an object to a local file"""
+
+    @abstractmethod
+    def delete_many(self, keys: List[str]):
+        pass
+
+    @abstractmethod
+    def iter_batches(self, prefix: str, size: int) -> Iterator[List[StoredObject]]:
+        """Objects directly under prefix ("" or "variants/"), in batches of at most size"""
+
+    def presigned_upload(self, key: str, content_type: str, max_bytes: int, expires_in: int) -> Optional[dict]:
+        """{"url", "fields"} for a browser multipart POST straight to storage, or None if unsupported"""
+        return None
+
+    def download_url(self, key: str, expires_in: int) -> Optional[str]:
+        """URL that serves the object without going through the API, or None if unsupported"""
+        return None
+
+SHARD_DIR = re.compile(r"^[0-9a-f]{2}$")
+
+class LocalStorage(StorageBackend):
+    """Files on local disk. With sharded=True new files go to {prefix}/ab/cd/{name}, where abcd
+    starts the SHA-256 of the name; files still in the old flat layout are found as a fallback."""
+
+    def __init__(self, root: Path, sharded: bool = False):
+        self.root = root
+        self.sharded = sharded
+
+    def _sharded_path(self, key: str) -> Path:
+        prefix, _, name = key.rpartition("/")
+        digest = hashlib.sha256(name.encode()).hexdigest()
+        return self.root / prefix / digest[:2] / digest[2:4] / name
+
+    def path(self, key: str) -> Path:
+        if not self.sharded:
+            return self.root / key
+        sharded = self._sharded_path(key)
+        if sharded.is_file():
+            return sharded
+        flat = self.root / key
+        if flat.is_file():
+            return flat
+        return sharded
+
+    def exists(self, key: str) -> bool:
+        return self.path(key).is_file()
+
+    def local_path(self, key: str) -> Optional[Path]:
+        return self.path(key)
+
+    def put_file(self, src: Path, key: str, content_type: Optional[str] = None):
+        dest = self._sharded_path(key) if self.sharded else self.root / key
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(src, dest)
+
+    def fetch_to(self, key: str, dest: Path):
+        shutil.copyfile(self.path(key), dest)
+
+    def delete_many(self, keys: List[str]):
+        for key in keys:
+            (self.root / key).unlink(missing_ok=True)
+            if self.sharded:
+                self._sharded_path(key).unlink(missing_ok=True)
+
+    def _iter_files(self, directory: Path, depth: int) -> Iterator[os.DirEntry]:
+        """Files in directory, plus files in ab/cd shard directories below it"""
+        if not directory.is_dir():
+            return
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                if entry.is_file(follow_symlinks=False):
+                    yield entry
+                elif depth and self.sharded and SHARD_DIR.match(entry.name) and entry.is_dir(follow_symlinks=False):
+                    yield from self._iter_files(Path(entry.path), depth - 1)
+
+    def iter_batches(self, prefix: str, size: int) -> Iterator[List[StoredObject]]:
+        directory = self.root / prefix if prefix else self.root
+        batch = []
+        for entry in self._iter_files(directory, 2):
+            stat = entry.stat(follow_symlinks=False)
+            batch.append((f"{prefix}{entry.name}", stat.st_mtime, stat.st_size))
+            if len(batch) >= size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def migrate_flat(self, prefix: str, limit: int) -> int:
+        """Move up to limit files from the flat layout under prefix into their shard directories"""
+        directory = self.root / prefix if prefix else self.root
+        moved = 0
+        for entry in self._iter_files(directory, 0):
+            if moved >= limit:
+                break
+            dest = self._sharded_path(f"{prefix}{entry.name}")
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                os.replace(entry.path, dest)
+            except FileNotFoundError:
+                continue  # moved by another worker
+            moved += 1
+        return moved
+
+class S3Storage(StorageBackend):
+    """Any S3-compatible store (AWS S3, MinIO, R2...). Set endpoint_url for non-AWS stores."""
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None,
+                 region: Optional[str] = None, access_key: Optional[str] = None,
+                 secret_key: Optional[str] = None, public_base_url: Optional[str] = None):
+        import boto3
+        from botocore.config import Config
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self.public_base_url = public_base_url.rstrip("/") if public_base_url else None
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=region,
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+            config=Config(signature_version="s3v4", s3={"addressing_style": "path" if endpoint_url else "auto"})
+        )
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def put_file(self, src: Path, key: str, content_type: Optional[str] = None):
+        extra = {"CacheControl": "public, max-age=31536000, immutable"}
+        if content_type:
+            extra["ContentType"] = content_type
+        self.client.upload_file(str(src), self.bucket, self._key(key), ExtraArgs=extra)
+        src.unlink(missing_ok=True)
+
+    def fetch_to(self, key: str, dest: Path):
+        self.client.download_file(self.bucket, self._key(key), str(dest))
+
+    def delete_many(self, keys: List[str]):
+        for start in range(0, len(keys), 1000):
+            chunk = keys[start:start + 1000]
+            self.client.delete_objects(
+                Bucket=self.bucket,
+                Delete={"Objects": [{"Key": self._key(key)} for key in chunk], "Quiet": True}
+            )
+
+    def iter_batches(self, prefix: str, size: int) -> Iterator[List[StoredObject]]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        pages = paginator.paginate(
+            Bucket=self.bucket,
+            Prefix=self._key(prefix),
+            Delimiter="/",
+            PaginationConfig={"PageSize": min(size, 1000)}
+        )
+        for page in pages:
+            batch = [
+                (obj["Key"][len(self.prefix):], obj["LastModified"].timestamp(), obj["Size"])
+                for obj in page.get("Contents", [])
+            ]
+            if batch:
+                yield batch
+
+    def presigned_upload(self, key: str, content_type: str, max_bytes: int, expires_in: int) -> Optional[dict]:
+        return self.client.generate_presigned_post(
+            Bucket=self.bucket,
+            Key=self._key(key),
+            Fields={"Content-Type": content_type, "Cache-Control": "public, max-age=31536000, immutable"},
+            Conditions=[
+                ["content-length-range", 1, max_bytes],
+                {"Content-Type": content_type},
+                {"Cache-Control": "public, max-age=31536000, immutable"}
+            ],
+            ExpiresIn=expires_in
+        )
+
+    def download_url(self, key: str, expires_in: int) -> Optional[str]:
+        if self.public_base_url:
+            return f"{self.public_base_url}/{self._key(key)}"
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": self._key(key)},
+            ExpiresIn=expires_in
+        )
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+import requests
+import sys
+import json
+import time
+import uuid
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+class ChatLoadBenchmark:
+    """Load-test the chat path offline against the local fake LLM provider.
+
+    Start the backend with CHAT_PROVIDER=fake FAKE_LLM_LATENCY=1 RATE_LIMIT_ENABLED=false, and tune
+    CHAT_MAX_CONCURRENCY / CHAT_MAX_QUEUE / CHAT_CALL_TIMEOUT to see how the gateway sheds load.
+    Every request uses a fresh session so the answer cache does not hide provider latency.
+    """
+
+    def __init__(self, base_url="http://localhost:8001/api", concurrency=32, requests_total=200):
+        self.base_url = base_url
+        self.concurrency = concurrency
+        self.requests_total = requests_total
+        self.fallback_marker = "having trouble"
+        self.results = {}
+
+    def chat_once(self, i):
+        start = time.perf_counter()
+        response = requests.post(
+            f"{self.base_url}/chat",
+            json={"message": f"Benchmark question {i}", "session_id": f"bench-{uuid.uuid4().hex}"},
+            timeout=120
+        )
+        elapsed = time.perf_counter() - start
+        answered = response.status_code == 200 and self.fallback_marker not in response.json().get("response", "")
+        return response.status_code, answered, elapsed
+
+    @staticmethod
+    def percentile(values, pct):
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def summarize(self, latencies):
+        return {
+            "count": len(latencies),
+            "p50_ms": round(self.percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(self.percentile(latencies, 95) * 1000, 2),
+            "max_ms": round(max(latencies) * 1000, 2) if latencies else 0.0
+        }
+
+    def run(self):
+        print(f"\n💬 Running chat load: {self.requests_total} requests, {self.concurrency} concurrent...")
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            outcomes = list(pool.map(self.chat_once, range(self.requests_total)))
+        elapsed = time.perf_counter() - start
+
+        answered = [latency for _, ok, latency in outcomes if ok]
+        fallbacks = [latency for status, ok, latency in outcomes if status == 200 and not ok]
+        errors = len([status for status, _, _ in outcomes if status != 200])
+
+        self.results = {
+            "requests": self.requests_total,
+            "concurrency": self.concurrency,
+            "elapsed_s": round(elapsed, 2),
+            "answered": self.summarize(answered),
+            "fallbacks": self.summarize(fallbacks),
+            "http_errors": errors
+        }
+
+        print(f"✅ Answered {len(answered)} ({self.results['answered']['p95_ms']} ms p95), "
+              f"fallbacks {len(fallbacks)} ({self.results['fallbacks']['p95_ms']} ms p95), HTTP errors {errors}")
+
+        results_data = {
+            "timestamp": datetime.now().isoformat(),
+            "results": self.results
+        }
+        with open('/app/test_reports/chat_benchmark_results.json', 'w') as f:
+            json.dump(results_data, f, indent=2)
+
+        return errors == 0
+
+if __name__ == "__main__":
+    base_url = sys.argv[1] if len(sys.argv) > 1 else "http://localhost:8001/api"
+    benchmark = ChatLoadBenchmark(base_url=base_url)
+    success = benchmark.run()
+    sys.exit(0 if success else 1)
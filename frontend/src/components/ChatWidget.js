@@ -14,11 +14,71 @@ const ChatWidget = () => {
   const [loading, setLoading] = useState(false);
   const [sessionId, setSessionId] = useState(null);
   const messagesEndRef = useRef(null);
+  const streamAbortRef = useRef(null);
 
   useEffect(() => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
   }, [messages]);
 
+  // Closing the widget or unmounting drops the stream, which lets the server stop the LLM call
+  useEffect(() => {
+    if (!isOpen) streamAbortRef.current?.abort();
+  }, [isOpen]);
+
+  useEffect(() => () => streamAbortRef.current?.abort(), []);
+
+  // Reads the /chat/stream Server-Sent Events and appends each delta to the last message
+  const streamReply = async (userMessage) => {
+    const controller = new AbortController();
+    streamAbortRef.current = controller;
+    const response = await fetch(`${API}/chat/stream`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ message: userMessage, session_id: sessionId }),
+      signal: controller.signal
+    });
+    if (!response.ok || !response.body) throw new Error(`Chat stream failed: ${response.status}`);
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let started = false;
+
+    const appendDelta = (delta) => {
+      if (!started) {
+        started = true;
+        setLoading(false);
+        setMessages(prev => [...prev, { role: 'assistant', content: delta }]);
+      } else {
+        setMessages(prev => {
+          const last = prev[prev.length - 1];
+          return [...prev.slice(0, -1), { ...last, content: last.content + delta }];
+        });
+      }
+    };
+
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const events = buffer.split('\n\n');
+      buffer = events.pop();
+      for (const raw of events) {
+        let event = 'message';
+        let data = '';
+        raw.split('\n').forEach(line => {
+          if (line.startsWith('event: ')) event = line.slice(7);
+          else if (line.startsWith('data: ')) data += line.slice(6);
+        });
+        if (!data) continue;
+        const payload = JSON.parse(data);
+        if (event === 'session') setSessionId(payload.session_id);
+        else if (payload.delta) appendDelta(payload.delta);
+      }
+    }
+    if (!started) throw new Error('Chat stream ended without a reply');
+  };
+
   const sendMessage = async () => {
     if (!input.trim() || loading) return;
 
@@ -28,6 +88,10 @@ const ChatWidget = () => {
     setLoading(true);
 
     try {
+      if (window.ReadableStream && window.TextDecoder) {
+        await streamReply(userMessage);
+        return;
+      }
       const response = await axios.post(`${API}/chat`, {
         message: userMessage,
         session_id: sessionId
@@ -39,11 +103,13 @@ const ChatWidget = () => {
       
       setMessages(prev => [...prev, { role: 'assistant', content: response.data.response }]);
     } catch (error) {
+      if (error.name === 'AbortError') return;
       setMessages(prev => [...prev, { 
         role: 'assistant', 
         content: 'I apologize, but I\'m having trouble right now. Please try again or contact us directly.' 
       }]);
     } finally {
+      streamAbortRef.current = null;
       setLoading(false);
     }
   };
@@ -33,12 +33,13 @@ const DashboardOverview = () => {
 
   const fetchData = async () => {
     try {
-      const [statsRes, bookingsRes] = await Promise.all([
-        axios.get(`${API}/admin/stats`, { headers: { Authorization: `Bearer ${token}` } }),
-        axios.get(`${API}/bookings`, { headers: { Authorization: `Bearer ${token}` } })
-      ]);
-      setStats(statsRes.data);
-      setRecentBookings(bookingsRes.data.slice(0, 5));
+      // One round trip for the stats and the latest bookings; the other tabs load their own data
+      const response = await axios.get(`${API}/admin/dashboard`, {
+        params: { page_size: 5, include: 'stats,bookings' },
+        headers: { Authorization: `Bearer ${token}` }
+      });
+      setStats(response.data.stats);
+      setRecentBookings(response.data.bookings.items);
     } catch (error) {
       toast.error('Failed to fetch data');
     } finally {
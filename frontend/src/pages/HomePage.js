@@ -3,7 +3,7 @@ import { Link } from 'react-router-dom';
 import { motion } from 'framer-motion';
 import { ArrowRight, Play, Mic, Sliders, Music, Volume2, Disc, MicVocal, Zap } from 'lucide-react';
 import axios from 'axios';
-import { resolveImageUrl, handleImageError } from '../utils/imageUtils';
+import { resolveImageUrl, handleImageError, imageMetaProps } from '../utils/imageUtils';
 
 const API = `${process.env.REACT_APP_BACKEND_URL}/api`;
 const LOGO_URL = "https://customer-assets.emergentagent.com/job_audio-haven-21/artifacts/kjwts159_HOGWARTS%20%20white%20bg%20only%20logo%20.jpg";
@@ -197,6 +197,7 @@ const HomePage = () => {
                     <div className="relative w-full h-40 rounded-2xl overflow-hidden mb-6 glass">
                       <img 
                         src={resolveImageUrl(service.image_url, 'service')} 
+                        {...imageMetaProps(service.image_meta)}
                         alt={service.name}
                         className="w-full h-full object-cover group-hover:scale-105 transition-all duration-500"
                         onError={(e) => handleImageError(e, 'service')}
@@ -264,6 +265,7 @@ const HomePage = () => {
                 {/* Project image */}
                 <img 
                   src={resolveImageUrl(project.image_url, 'project')} 
+                  {...imageMetaProps(project.image_meta)}
                   alt={project.name}
                   className="absolute inset-0 w-full h-full object-cover group-hover:scale-105 transition-all duration-700"
                   onError={(e) => handleImageError(e, 'project')}
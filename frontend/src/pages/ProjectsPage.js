@@ -2,7 +2,7 @@ import { useEffect, useState } from 'react';
 import { motion } from 'framer-motion';
 import { Play, ExternalLink, Zap } from 'lucide-react';
 import axios from 'axios';
-import { resolveImageUrl, handleImageError } from '../utils/imageUtils';
+import { resolveImageUrl, handleImageError, imageMetaProps } from '../utils/imageUtils';
 
 const API = `${process.env.REACT_APP_BACKEND_URL}/api`;
 
@@ -135,6 +135,7 @@ const ProjectsPage = () => {
                     <div className="absolute inset-0">
                       <img 
                         src={resolveImageUrl(project.image_url, 'project')} 
+                        {...imageMetaProps(project.image_meta)}
                         alt={project.name}
                         className="w-full h-full object-cover group-hover:scale-105 transition-all duration-700"
                         onError={(e) => handleImageError(e, 'project')}
@@ -3,7 +3,7 @@ import { Link } from 'react-router-dom';
 import { motion } from 'framer-motion';
 import { ArrowRight, Mic, MicVocal, Sliders, Music, Volume2, Disc, Zap } from 'lucide-react';
 import axios from 'axios';
-import { resolveImageUrl, handleImageError } from '../utils/imageUtils';
+import { resolveImageUrl, handleImageError, imageMetaProps } from '../utils/imageUtils';
 
 const API = `${process.env.REACT_APP_BACKEND_URL}/api`;
 
@@ -110,6 +110,7 @@ const ServicesPage = () => {
                       <div className="relative h-48 overflow-hidden">
                         <img 
                           src={resolveImageUrl(service.image_url, 'service')} 
+                          {...imageMetaProps(service.image_meta)}
                           alt={service.name}
                           className="w-full h-full object-cover group-hover:scale-105 transition-all duration-700"
                           onError={(e) => handleImageError(e, 'service')}
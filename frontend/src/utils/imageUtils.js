@@ -38,6 +38,27 @@ export const resolveImageUrl = (url, type = 'default') => {
   return url;
 };
 
+/**
+ * Props for an <img> from the image_meta the API stores with uploaded images:
+ * intrinsic size (so the browser reserves space) and a blurred placeholder
+ * painted behind the image until it loads.
+ */
+export const imageMetaProps = (meta) => {
+  if (!meta) {
+    return {};
+  }
+  return {
+    width: meta.width,
+    height: meta.height,
+    style: {
+      backgroundColor: meta.dominant_color,
+      backgroundImage: meta.placeholder ? `url(${meta.placeholder})` : undefined,
+      backgroundSize: 'cover',
+      backgroundPosition: 'center',
+    },
+  };
+};
+
 /**
  * Get a placeholder image for a specific type
  */
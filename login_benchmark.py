@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+
+import requests
+import sys
+import json
+import time
+import uuid
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+class LoginStormBenchmark:
+    """Measure login throughput and the latency of unrelated endpoints during a login storm.
+
+    bcrypt runs on a worker pool, so cheap endpoints should stay fast while logins are in flight.
+    Start the backend with RATE_LIMIT_ENABLED=false, otherwise the login policy throttles the storm.
+    """
+
+    def __init__(self, base_url="http://localhost:8001/api", concurrency=16, logins=200):
+        self.base_url = base_url
+        self.concurrency = concurrency
+        self.logins = logins
+        self.email = f"bench_{uuid.uuid4().hex[:8]}@example.com"
+        self.password = "BenchPass123!"
+        self.results = {}
+
+    def setup_user(self):
+        """Register a throwaway user to log in as"""
+        response = requests.post(
+            f"{self.base_url}/auth/register",
+            json={"name": "Benchmark User", "email": self.email, "password": self.password},
+            timeout=30
+        )
+        if response.status_code != 200:
+            print(f"❌ Could not register benchmark user: {response.status_code} {response.text[:100]}")
+            return False
+        print(f"✅ Registered benchmark user {self.email}")
+        return True
+
+    def login_once(self, _):
+        start = time.perf_counter()
+        response = requests.post(
+            f"{self.base_url}/auth/login",
+            json={"email": self.email, "password": self.password},
+            timeout=60
+        )
+        return response.status_code, time.perf_counter() - start
+
+    @staticmethod
+    def percentile(values, pct):
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def summarize(self, latencies):
+        return {
+            "count": len(latencies),
+            "p50_ms": round(self.percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(self.percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(self.percentile(latencies, 99) * 1000, 2),
+            "max_ms": round(max(latencies) * 1000, 2) if latencies else 0.0
+        }
+
+    def probe_endpoint(self, endpoint, stop_event, latencies):
+        """Hit a cheap endpoint in a loop until the storm is over"""
+        while not stop_event.is_set():
+            start = time.perf_counter()
+            try:
+                requests.get(f"{self.base_url}/{endpoint}", timeout=30)
+                latencies.append(time.perf_counter() - start)
+            except Exception as e:
+                print(f"⚠️ Probe {endpoint} failed: {e}")
+            time.sleep(0.05)
+
+    def measure_baseline(self, endpoint, samples=20):
+        latencies = []
+        for _ in range(samples):
+            start = time.perf_counter()
+            requests.get(f"{self.base_url}/{endpoint}", timeout=30)
+            latencies.append(time.perf_counter() - start)
+        return self.summarize(latencies)
+
+    def run_storm(self, probe_endpoints=("", "services")):
+        print(f"\n🔐 Running login storm: {self.logins} logins, {self.concurrency} concurrent...")
+        baselines = {endpoint or "root": self.measure_baseline(endpoint) for endpoint in probe_endpoints}
+
+        stop_event = threading.Event()
+        probe_latencies = {endpoint: [] for endpoint in probe_endpoints}
+        probes = [
+            threading.Thread(target=self.probe_endpoint, args=(endpoint, stop_event, probe_latencies[endpoint]), daemon=True)
+            for endpoint in probe_endpoints
+        ]
+        for probe in probes:
+            probe.start()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            outcomes = list(pool.map(self.login_once, range(self.logins)))
+        elapsed = time.perf_counter() - start
+
+        stop_event.set()
+        for probe in probes:
+            probe.join()
+
+        login_latencies = [latency for status, latency in outcomes if status == 200]
+        failures = len(outcomes) - len(login_latencies)
+
+        self.results = {
+            "logins": self.logins,
+            "concurrency": self.concurrency,
+            "failures": failures,
+            "elapsed_s": round(elapsed, 2),
+            "login_throughput_per_s": round(len(login_latencies) / elapsed, 2) if elapsed else 0.0,
+            "login_latency": self.summarize(login_latencies),
+            "unrelated_endpoints": {
+                (endpoint or "root"): {
+                    "baseline": baselines[endpoint or "root"],
+                    "during_storm": self.summarize(latencies)
+                }
+                for endpoint, latencies in probe_latencies.items()
+            }
+        }
+
+        print(f"✅ Login throughput: {self.results['login_throughput_per_s']} logins/s ({failures} failures)")
+        print(f"   Login latency p50/p95: {self.results['login_latency']['p50_ms']} / {self.results['login_latency']['p95_ms']} ms")
+        for name, data in self.results["unrelated_endpoints"].items():
+            print(f"   /{name} p95 baseline {data['baseline']['p95_ms']} ms -> during storm {data['during_storm']['p95_ms']} ms")
+        return failures == 0
+
+    def run(self):
+        if not self.setup_user():
+            return False
+        success = self.run_storm()
+
+        results_data = {
+            "timestamp": datetime.now().isoformat(),
+            "results": self.results
+        }
+        with open('/app/test_reports/login_benchmark_results.json', 'w') as f:
+            json.dump(results_data, f, indent=2)
+
+        return success
+
+if __name__ == "__main__":
+    base_url = sys.argv[1] if len(sys.argv) > 1 else "http://localhost:8001/api"
+    benchmark = LoginStormBenchmark(base_url=base_url)
+    success = benchmark.run()
+    sys.exit(0 if success else 1)
@@ -2,6 +2,9 @@
 """
 Hogwarts Music Studio - OTP Flows Testing
 Tests specific OTP functionality for admin and user forgot password flows
+
+Sends four password reset requests from one address, more than the password_reset policy
+allows, so start the backend with RATE_LIMIT_ENABLED=false when running this against it.
 """
 
 import requests
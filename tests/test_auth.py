@@ -0,0 +1,51 @@
+import asyncio
+import time
+
+import jwt
+import pytest
+from fastapi import HTTPException
+
+import server
+
+
+def test_session_token_round_trip():
+    token = server.create_token({"user_id": "u1", "email": "a@example.com", "role": "user"})
+    assert server.decode_token(token)["user_id"] == "u1"
+
+
+def test_direct_upload_token_is_not_a_session_token():
+    upload = asyncio.run(server.presign_upload("abc.jpg", "image/jpeg", 1024))
+    token = upload["upload"]["fields"]["token"]
+
+    claims = jwt.decode(token, server.JWT_SECRET, algorithms=["HS256"], audience=server.UPLOAD_TOKEN_AUDIENCE)
+    assert claims["key"] == "abc.jpg"
+    with pytest.raises(HTTPException) as exc:
+        server.decode_token(token)
+    assert exc.value.status_code == 401
+
+
+def test_scoped_claims_without_audience_are_rejected():
+    token = server.create_token({"purpose": "direct_upload", "key": "abc.jpg", "role": "admin"})
+    with pytest.raises(HTTPException):
+        server.decode_token(token)
+
+
+def test_revocation_rejects_tokens_from_the_same_second():
+    email = "same-second@example.com"
+    before = server.create_token({"user_id": "u2", "email": email, "role": "user"})
+    server.decode_token(before)  # cached
+
+    server.apply_token_revocation(f"user:{email}", time.time())
+    after = server.create_token({"user_id": "u2", "email": email, "role": "user"})
+
+    with pytest.raises(HTTPException) as exc:
+        server.decode_token(before)
+    assert exc.value.detail == "Token revoked"
+    assert server.decode_token(after)["user_id"] == "u2"
+
+
+def test_older_revocation_does_not_override_newer():
+    subject = "admin:order@example.com"
+    server.apply_token_revocation(subject, 2000.0)
+    server.apply_token_revocation(subject, 1000.0)
+    assert server._token_revocations[subject] == 2000.0
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+import server
+
+NEW_SESSION = {"turns": [], "summary": ""}
+
+
+@pytest.fixture
+def seeded_index(monkeypatch):
+    monkeypatch.setattr(server, "db", AsyncMongoMockClient()["chat_answer_test"])
+    # Restored afterwards: rebuild_chat_index replaces these globals
+    monkeypatch.setattr(server, "chat_index", server.chat_index)
+    monkeypatch.setattr(server, "service_name_index", server.service_name_index)
+    monkeypatch.setattr(server, "_chat_index_state", dict(server._chat_index_state))
+
+    async def seed():
+        await server.db.services.insert_many([dict(s) for s in server.DEFAULT_SERVICES])
+        await server.db.projects.insert_many([dict(p) for p in server.DEFAULT_PROJECTS])
+        await server.rebuild_chat_index()
+
+    asyncio.run(seed())
+
+
+@pytest.mark.parametrize("question", [
+    "How much does dubbing cost?",
+    "What is the price of dubbing?",
+    "dubbing rates",
+])
+def test_price_question_gets_a_direct_answer(seeded_index, question):
+    answer = server.direct_answer(question, NEW_SESSION)
+    assert answer is not None and answer.startswith("Dubbing:")
+    assert "₹299/hr" in answer
+
+
+@pytest.mark.parametrize("question", [
+    "How much?",
+    "What are your rates for mixing and mastering?",
+])
+def test_ambiguous_price_question_goes_to_the_model(seeded_index, question):
+    assert server.direct_answer(question, NEW_SESSION) is None
+
+
+def test_price_question_follows_service_edits(seeded_index):
+    service = dict(server.DEFAULT_SERVICES[0], id="new-service", name="Podcast Editing", price="₹999")
+
+    async def add_and_remove():
+        await server.db.services.insert_one(dict(service))
+        await server.reindex_chat_source("service", service["id"])
+        answer = server.direct_answer("How much is podcast editing?", NEW_SESSION)
+        await server.db.services.delete_one({"id": service["id"]})
+        await server.reindex_chat_source("service", service["id"])
+        return answer
+
+    assert "₹999" in asyncio.run(add_and_remove())
+    assert server.direct_answer("How much is podcast editing?", NEW_SESSION) is None
+
+
+def test_direct_answer_only_on_first_turn(seeded_index):
+    session = {"turns": [{"role": "user", "content": "hi"}], "summary": ""}
+    assert server.direct_answer("How much does dubbing cost?", session) is None
@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from chat_providers import ChatGateway, ChatProvider, ChatUnavailable, FakeProvider
+
+
+class TrackingProvider(FakeProvider):
+    """FakeProvider that records the most calls it ever had running at once"""
+
+    def __init__(self, latency: float = 0.0, token_delay: float = 0.0):
+        super().__init__(latency, token_delay)
+        self.running = 0
+        self.peak = 0
+
+    async def stream(self, system_message, session_id, message):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            async for chunk in super().stream(system_message, session_id, message):
+                yield chunk
+        finally:
+            self.running -= 1
+
+
+class FailingProvider(ChatProvider):
+    async def stream(self, system_message, session_id, message):
+        raise RuntimeError("provider down")
+        yield
+
+
+def make_gateway(provider, max_concurrency=2, max_queue=10, queue_timeout=5.0, call_timeout=5.0):
+    return ChatGateway(provider, max_concurrency, max_queue, queue_timeout, call_timeout)
+
+
+async def complete_all(gateway, n):
+    return await asyncio.gather(
+        *[gateway.complete("system", f"s{i}", f"question {i}") for i in range(n)],
+        return_exceptions=True
+    )
+
+
+def test_complete_returns_whole_reply():
+    gateway = make_gateway(FakeProvider(token_delay=0.001))
+    reply = asyncio.run(gateway.complete("system", "s", "mixing"))
+    assert reply == FakeProvider().reply("mixing")
+    assert gateway.snapshot() == {
+        "calls": 1, "rejected": 0, "queue_timeouts": 0, "timeouts": 0, "errors": 0,
+        "in_flight": 0, "queued": 0, "max_concurrency": 2, "max_queue": 10
+    }
+
+
+def test_concurrency_is_capped():
+    provider = TrackingProvider(latency=0.05)
+    gateway = make_gateway(provider, max_concurrency=2)
+    results = asyncio.run(complete_all(gateway, 6))
+
+    assert all(isinstance(r, str) for r in results)
+    assert provider.peak == 2
+    assert gateway.stats["calls"] == 6
+    assert gateway.in_flight == 0 and gateway.queued == 0
+
+
+def test_full_queue_is_rejected():
+    gateway = make_gateway(FakeProvider(latency=0.1), max_concurrency=1, max_queue=2)
+    results = asyncio.run(complete_all(gateway, 5))
+
+    rejected = [r for r in results if isinstance(r, ChatUnavailable)]
+    assert len(rejected) == 2 and all("queue is full" in str(r) for r in rejected)
+    assert sum(isinstance(r, str) for r in results) == 3
+    assert gateway.stats["rejected"] == 2 and gateway.stats["calls"] == 3
+    assert gateway.queued == 0
+
+
+def test_queue_wait_times_out():
+    gateway = make_gateway(FakeProvider(latency=0.2), max_concurrency=1, queue_timeout=0.05)
+    results = asyncio.run(complete_all(gateway, 3))
+
+    assert isinstance(results[0], str)
+    assert all(isinstance(r, ChatUnavailable) for r in results[1:])
+    assert gateway.stats["queue_timeouts"] == 2 and gateway.stats["calls"] == 1
+    assert gateway.queued == 0 and gateway.in_flight == 0
+
+
+@pytest.mark.parametrize("latency, token_delay", [(0.2, 0.0), (0.0, 0.02)])
+def test_call_timeout_covers_the_whole_stream(latency, token_delay):
+    # Each token arrives well within the timeout; the reply as a whole does not
+    gateway = make_gateway(FakeProvider(latency, token_delay), call_timeout=0.1)
+    with pytest.raises(ChatUnavailable, match="timed out"):
+        asyncio.run(gateway.complete("system", "s", "mixing"))
+
+    assert gateway.stats["timeouts"] == 1 and gateway.stats["errors"] == 0
+    assert gateway.in_flight == 0
+
+
+def test_slot_is_released_after_timeout_and_error():
+    gateway = make_gateway(FakeProvider(latency=0.2), max_concurrency=1, call_timeout=0.05)
+
+    async def scenario():
+        with pytest.raises(ChatUnavailable):
+            await gateway.complete("system", "s", "first")
+        gateway.provider = FailingProvider()
+        with pytest.raises(RuntimeError):
+            await gateway.complete("system", "s", "second")
+        gateway.provider = FakeProvider()
+        return await gateway.complete("system", "s", "third")
+
+    assert asyncio.run(scenario()) == FakeProvider().reply("third")
+    assert gateway.stats["timeouts"] == 1 and gateway.stats["errors"] == 1
+    assert gateway.stats["calls"] == 3 and gateway.in_flight == 0
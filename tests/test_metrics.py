@@ -0,0 +1,66 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from metrics import MetricsMiddleware, MetricsRegistry
+
+
+def sample(text, line_start):
+    lines = [line for line in text.splitlines() if line.startswith(line_start)]
+    assert len(lines) == 1, lines
+    return float(lines[0].rsplit(" ", 1)[1])
+
+
+def test_render_histogram_is_cumulative():
+    registry = MetricsRegistry(buckets=(0.1, 1.0))
+    registry.observe("GET", "/api/services", 200, 0.05, 0, 100)
+    registry.observe("GET", "/api/services", 200, 0.5, 0, 100)
+    registry.observe("GET", "/api/services", 200, 3.0, 0, 100)
+    text = registry.render()
+
+    labels = 'method="GET",route="/api/services",status="200"'
+    assert sample(text, f'http_request_duration_seconds_bucket{{{labels},le="0.1"}}') == 1
+    assert sample(text, f'http_request_duration_seconds_bucket{{{labels},le="1.0"}}') == 2
+    assert sample(text, f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}}') == 3
+    assert sample(text, f"http_request_duration_seconds_count{{{labels}}}") == 3
+    assert sample(text, f"http_request_duration_seconds_sum{{{labels}}}") == 3.55
+    assert sample(text, 'http_response_size_bytes_total{method="GET",route="/api/services"}') == 300
+    assert text.count("# TYPE http_request_duration_seconds histogram") == 1
+    assert text.endswith("\n")
+
+
+def test_render_separates_status_and_extra_samples():
+    registry = MetricsRegistry(buckets=(1.0,))
+    registry.observe("POST", "/api/chat", 200, 0.2, 50, 10)
+    registry.observe("POST", "/api/chat", 429, 0.01, 40, 5)
+    text = registry.render([
+        ("cache_hits_total", "Cache hits", "counter", {"cache": "token"}, 7),
+        ("cache_hits_total", "Cache hits", "counter", {"cache": 'a"b\\c'}, 1),
+        ("chat_in_flight", "Chat calls", "gauge", {}, 2)
+    ])
+
+    assert 'status="429"' in text and 'status="200"' in text
+    assert sample(text, 'http_request_size_bytes_total{method="POST",route="/api/chat"}') == 90
+    assert text.count("# HELP cache_hits_total Cache hits") == 1
+    assert sample(text, 'cache_hits_total{cache="token"}') == 7
+    assert sample(text, 'cache_hits_total{cache="a\\"b\\\\c"}') == 1
+    assert sample(text, "chat_in_flight ") == 2
+
+
+def test_middleware_labels_by_route_template():
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: str):
+        return {"id": item_id}
+
+    registry = MetricsRegistry()
+    app.add_middleware(MetricsMiddleware, registry=registry)
+    client = TestClient(app)
+    client.get("/items/1")
+    client.get("/items/2")
+    client.get("/nowhere")
+
+    assert sum(registry.latency[("GET", "/items/{item_id}", "200")][:-1]) == 2
+    assert ("GET", "unmatched", "404") in registry.latency
+    assert registry.sizes[("GET", "/items/{item_id}")][1] > 0
+    assert registry.in_flight == 0
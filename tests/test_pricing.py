@@ -0,0 +1,44 @@
+import pytest
+
+from server import DEFAULT_PRICE_CURRENCY, parse_price, price_snapshot, with_structured_price
+
+
+@pytest.mark.parametrize("price, amount, currency, unit", [
+    ("₹299/hr", 299.0, "INR", "hour"),
+    ("$1,200", 1200.0, "USD", "project"),
+    ("Rs. 500 per session", 500.0, "INR", "session"),
+    ("1500 INR / song", 1500.0, "INR", "song"),
+    ("€49.99/track", 49.99, "EUR", "track"),
+    ("£80 per hours", 80.0, "GBP", "hour"),
+    ("2 hours ₹600", 600.0, "INR", "project"),
+])
+def test_parse_price(price, amount, currency, unit):
+    assert parse_price(price) == {"price_amount": amount, "price_currency": currency, "price_unit": unit}
+
+
+def test_parse_price_without_currency_uses_default():
+    assert parse_price("500/hr") == {"price_amount": 500.0, "price_currency": DEFAULT_PRICE_CURRENCY, "price_unit": "hour"}
+
+
+@pytest.mark.parametrize("price", [None, "", "Contact for pricing"])
+def test_parse_price_without_number(price):
+    assert parse_price(price) == {"price_amount": None, "price_currency": None, "price_unit": None}
+
+
+def test_with_structured_price_keeps_explicit_fields():
+    parsed = with_structured_price({"price": "₹299/hr"})
+    assert parsed["price_amount"] == 299.0
+
+    explicit = {"price": "₹299/hr", "price_amount": 250.0, "price_currency": "INR", "price_unit": "hour"}
+    assert with_structured_price(dict(explicit)) == explicit
+
+
+def test_price_snapshot():
+    hourly = {"price_amount": 299.0, "price_currency": "INR", "price_unit": "hour"}
+    assert price_snapshot(hourly, 3)["expected_amount"] == 897.0
+    assert price_snapshot(hourly, None)["expected_amount"] is None
+
+    project = {"price_amount": 5000.0, "price_currency": "INR", "price_unit": "project"}
+    assert price_snapshot(project, 3) == {**project, "expected_amount": 5000.0}
+
+    assert price_snapshot(None, 2) == {"price_amount": None, "price_currency": None, "price_unit": None, "expected_amount": None}
@@ -0,0 +1,46 @@
+import pytest
+
+from server import MAX_RANGES, _parse_ranges
+
+SIZE = 1000
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", [(0, 99)]),
+    ("bytes=500-", [(500, 999)]),
+    ("bytes=-100", [(900, 999)]),
+    ("bytes=-5000", [(0, 999)]),
+    ("bytes=900-5000", [(900, 999)]),
+    ("bytes=0-0, 10-19,-1", [(0, 0), (10, 19), (999, 999)]),
+    ("BYTES = 0-9", [(0, 9)]),
+])
+def test_satisfiable_ranges(header, expected):
+    assert _parse_ranges(header, SIZE) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=2000-3000", "bytes=-0"])
+def test_unsatisfiable_ranges(header):
+    assert _parse_ranges(header, SIZE) == []
+
+
+def test_unsatisfiable_parts_are_dropped():
+    assert _parse_ranges("bytes=0-9,5000-6000", SIZE) == [(0, 9)]
+
+
+@pytest.mark.parametrize("header", [
+    "items=0-10",
+    "bytes=",
+    "bytes=10",
+    "bytes=a-b",
+    "bytes=-",
+    "bytes=20-10",
+])
+def test_malformed_headers_are_ignored(header):
+    assert _parse_ranges(header, SIZE) is None
+
+
+def test_too_many_ranges_are_ignored():
+    header = "bytes=" + ",".join(f"{i}-{i}" for i in range(MAX_RANGES + 1))
+    assert _parse_ranges(header, SIZE) is None
+    header = "bytes=" + ",".join(f"{i}-{i}" for i in range(MAX_RANGES))
+    assert len(_parse_ranges(header, SIZE)) == MAX_RANGES
@@ -0,0 +1,97 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+from mongomock_motor import AsyncMongoMockClient
+from starlette.requests import Request
+
+import server
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(server.time, "monotonic", clock)
+    monkeypatch.setattr(server.time, "time", clock)
+    monkeypatch.setattr(server, "_rate_buckets", {})
+    return clock
+
+
+def test_memory_bucket_refills_and_reports_wait(clock):
+    assert server._take_token_memory("k", 2, 0.5) == 0
+    assert server._take_token_memory("k", 2, 0.5) == 0
+    assert server._take_token_memory("k", 2, 0.5) == pytest.approx(2.0)
+
+    clock.now += 1
+    assert server._take_token_memory("k", 2, 0.5) == pytest.approx(1.0)
+    clock.now += 1
+    assert server._take_token_memory("k", 2, 0.5) == 0
+
+    # Refill is capped at capacity however long the bucket sat idle
+    clock.now += 3600
+    assert [server._take_token_memory("k", 2, 0.5) for _ in range(3)][-1] > 0
+
+
+def test_memory_check_does_not_consume(clock):
+    for _ in range(5):
+        assert server._take_token_memory("k", 1, 0.1, cost=0) == 0
+    assert server._take_token_memory("k", 1, 0.1) == 0
+    assert server._take_token_memory("k", 1, 0.1, cost=0) == pytest.approx(10.0)
+
+
+def test_memory_evicts_idle_buckets(clock, monkeypatch):
+    monkeypatch.setattr(server, "_RATE_BUCKET_LIMIT", 2)
+    for key in ("a", "b", "c"):
+        server._take_token_memory(key, 3, 1)
+    clock.now += 10
+    server._take_token_memory("d", 3, 1)
+    assert set(server._rate_buckets) == {"a", "b", "c", "d"}
+
+    clock.now += server._RATE_BUCKET_IDLE_SECONDS + 1
+    server._take_token_memory("c", 3, 1)
+    server._take_token_memory("e", 3, 1)
+    assert set(server._rate_buckets) == {"c", "e"}
+
+
+def test_mongo_bucket_matches_memory_bucket(clock, monkeypatch):
+    monkeypatch.setattr(server, "db", AsyncMongoMockClient()["rate_limit_test"])
+
+    async def scenario():
+        waits = [await server._take_token_mongo("k", 2, 0.5) for _ in range(3)]
+        assert waits[:2] == [0, 0] and waits[2] == pytest.approx(2.0)
+        clock.now += 1
+        assert await server._take_token_mongo("k", 2, 0.5) == pytest.approx(1.0)
+        assert await server._take_token_mongo("k", 2, 0.5, cost=0) == pytest.approx(1.0)
+        clock.now += 1
+        assert await server._take_token_mongo("k", 2, 0.5, cost=0) == 0
+        assert await server._take_token_mongo("k", 2, 0.5) == 0
+
+        # Idle buckets expire once they would have refilled to capacity
+        doc = await server.db.rate_limits.find_one({"_id": "k"})
+        expires_in = doc["expires_at"].replace(tzinfo=timezone.utc) - datetime.now(timezone.utc)
+        assert 3 < expires_in.total_seconds() <= 4
+
+    asyncio.run(scenario())
+
+
+def test_enforce_rate_limit_sets_retry_after(clock, monkeypatch):
+    monkeypatch.setattr(server, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(server, "RATE_LIMIT_BACKEND", "memory")
+    monkeypatch.setitem(server.RATE_LIMIT_POLICIES, "test", (1, 1 / 30))
+    request = Request({"type": "http", "headers": [], "client": ("203.0.113.7", 4000)})
+
+    asyncio.run(server.enforce_rate_limit(request, "test", "A@example.com"))
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(server.enforce_rate_limit(request, "test", "a@example.com"))
+    assert exc.value.status_code == 429
+    assert exc.value.headers["Retry-After"] == "30"
+    assert set(server._rate_buckets) == {"test:ip:203.0.113.7", "test:email:a@example.com"}
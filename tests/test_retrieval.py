@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from retrieval import BM25Index, tokenize
+
+
+def make_index():
+    index = BM25Index()
+    index.upsert("service:mix", "Mixing and mastering for bands and podcasts", "Mixing: from 500/hr")
+    index.upsert("service:dub", "Dubbing and voice over recording for films", "Dubbing: from 800/hr")
+    index.upsert("content:contact", "Phone email address location contact", "Call us on 12345")
+    return index
+
+
+def assert_consistent(index):
+    """Row bookkeeping and document frequencies match a fresh count over the stored rows"""
+    assert len(index.ids) == len(index.snippets) == index.tf.shape[0] == len(index.lengths)
+    assert all(index.ids[row] == doc_id for doc_id, row in index.rows.items())
+    assert len(index.rows) == len(index.ids)
+    np.testing.assert_array_equal(index.df, (index.tf > 0).sum(axis=0))
+    np.testing.assert_array_equal(index.lengths, index.tf.sum(axis=1))
+
+
+def test_tokenize_drops_stopwords_and_plural_s():
+    assert tokenize("What are your Services and prices?") == ["service", "price"]
+    assert tokenize("class bus mixes") == ["class", "bus", "mixe"]
+
+
+def test_upsert_replaces_existing_document():
+    index = make_index()
+    index.upsert("service:mix", "Live sound engineering", "Live sound: on request")
+    assert len(index) == 3
+    assert_consistent(index)
+    assert index.search("mastering", 3) == []
+    assert index.search("live sound", 1)[0][0] == "service:mix"
+
+
+def test_remove_moves_last_row_into_the_gap():
+    index = make_index()
+    index.remove("service:mix")
+    assert index.ids == ["content:contact", "service:dub"]
+    assert index.rows == {"content:contact": 0, "service:dub": 1}
+    assert index.snippets[0] == "Call us on 12345"
+    assert_consistent(index)
+    assert index.search("phone", 1)[0][0] == "content:contact"
+    assert index.search("mixing", 3) == []
+
+
+def test_remove_last_row_and_unknown_id():
+    index = make_index()
+    index.remove("content:contact")
+    index.remove("missing")
+    assert index.ids == ["service:mix", "service:dub"]
+    assert_consistent(index)
+    index.remove("service:mix")
+    index.remove("service:dub")
+    assert len(index) == 0
+    assert index.search("dubbing", 3) == []
+
+
+def test_search_ranks_and_limits():
+    index = make_index()
+    hits = index.search("voice over dubbing for my film", 2)
+    assert [doc_id for doc_id, _, _ in hits] == ["service:dub"]
+    assert hits[0][2] == "Dubbing: from 800/hr" and hits[0][1] > 0
+
+    index.upsert("project:film", "Film score mixing project", "Project Film score")
+    hits = index.search("film score mixing", 2)
+    assert len(hits) == 2 and hits[0][0] == "project:film"
+    assert hits[0][1] >= hits[1][1]
+
+
+def test_search_without_known_terms():
+    assert make_index().search("the and of", 3) == []
+    assert BM25Index().search("mixing", 3) == []
+
+
+def test_best_answer_confidence():
+    index = make_index()
+    doc_id, confidence, snippet = index.best_answer("dubbing voice recording")
+    assert doc_id == "service:dub" and snippet == "Dubbing: from 800/hr"
+    assert 0.6 < confidence <= 1.0
+
+    # Words the index has never seen count against coverage
+    _, vague, _ = index.best_answer("dubbing guitar drums piano lessons")
+    assert vague < confidence
+
+    # Two documents matching equally well cancel out
+    index.upsert("service:dub2", "Dubbing and voice over recording for films", "Dubbing again")
+    _, tied, _ = index.best_answer("dubbing voice recording")
+    assert tied == pytest.approx(0.0)
+
+    assert index.best_answer("guitar lessons") is None
@@ -0,0 +1,47 @@
+import asyncio
+import os
+import time
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+import server
+from storage import LocalStorage
+
+
+def aged(path, hours, data=b"data"):
+    path.write_bytes(data)
+    then = time.time() - hours * 3600
+    os.utime(path, (then, then))
+
+
+@pytest.fixture
+def stores(tmp_path, monkeypatch):
+    uploads, scratch = tmp_path / "uploads", tmp_path / "scratch"
+    uploads.mkdir()
+    scratch.mkdir()
+    monkeypatch.setattr(server, "db", AsyncMongoMockClient()["upload_gc_test"])
+    monkeypatch.setattr(server, "storage", LocalStorage(uploads))
+    monkeypatch.setattr(server, "upload_scratch", LocalStorage(scratch))
+    return uploads, scratch
+
+
+def test_grace_period_has_a_floor(stores):
+    uploads, _ = stores
+    aged(uploads / "fresh.jpg", 0.5)
+    aged(uploads / "old.jpg", 2)
+
+    for grace_hours in (0, -5):
+        report = asyncio.run(server.collect_orphaned_uploads(dry_run=True, grace_hours=grace_hours))
+        assert report["grace_hours"] == server.UPLOAD_GC_MIN_GRACE_HOURS
+        assert report["files"] == ["old.jpg"]
+
+
+def test_scratch_sweep_keeps_recent_temp_files(stores):
+    _, scratch = stores
+    aged(scratch / "in-progress.part", server.UPLOAD_GC_SCRATCH_MIN_HOURS - 1)
+    aged(scratch / "abandoned.part", server.UPLOAD_GC_SCRATCH_MIN_HOURS + 1)
+
+    report = asyncio.run(server.collect_orphaned_uploads(dry_run=False, grace_hours=1))
+    assert report["files"] == ["abandoned.part"]
+    assert sorted(p.name for p in scratch.iterdir()) == ["in-progress.part"]